@@ -1,23 +1,58 @@
-from fastapi import APIRouter, HTTPException,Query,Request
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException,Query,Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from app.schemas.design import BuildGraphRequest, GraphResponse,ExpandNodeRequest, CanonicalGraphResponse
 from app.services.design_service import DesignService
 from app.services.snapshot_service import SnapshotService
+from app.services.layout_service import LayoutService
+from app.services.graph_query_service import GraphQueryService
+from app.services.speculation_service import speculator
 from app.schemas.design import (
     BuildGraphRequest, 
     GraphResponse,
     ExpandNodeRequest, 
     CanonicalGraphResponse,
-    GraphDiffResponse
+    GraphDiffResponse,
+    BatchBuildGraphRequest,
+    ExpandNodesRequest,
+    JobSubmitResponse
+)
+from app.core.rate_limiter import (
+    limiter,
+    cost_aware_limit,
+    charge_tokens,
+    charge_llm_calls,
+    track_llm_calls,
+    llm_concurrency,
+    LLMOverloadedError
 )
-from app.core.rate_limiter import limiter
 from app.core.cost_monitor import cost_monitor
 from app.core.performance import perf_monitor
+from app.core.cache import get_cached_responses
+from app.core.config import (
+    BATCH_MAX_SYSTEMS,
+    BATCH_LLM_CONCURRENCY,
+    EXPAND_MAX_NODES,
+    LLM_CALL_WEIGHT,
+    RATE_LIMIT_BUILD_TOKENS,
+    RATE_LIMIT_EXPAND_TOKENS,
+    GRAPH_QUERY_MAX_PAGE
+)
+from app.core.job_queue import job_queue
+from app.core.circuit_breaker import CircuitOpenError, llm_breaker
+from app.llm.client import llm_router, build_prompt
+from app.services.cache_warmer import cache_warmer
+from app.services.snapshot_retention import snapshot_pruner
+from app.core.graph_events import graph_event_hub, get_history
 
 router = APIRouter()
 
 
-@router.post("/build-graph")
-@limiter.limit("5/minute")  # Strict limit for expensive LLM calls
+@router.post(
+    "/build-graph",
+    dependencies=[Depends(cost_aware_limit("build", RATE_LIMIT_BUILD_TOKENS))]
+)
 async def build_graph(
     request: Request,
     payload: BuildGraphRequest,
@@ -26,30 +61,79 @@ async def build_graph(
     """
     Build system architecture graph.
     
-    Rate limit: 5 requests per minute per IP
+    Rate limit: RATE_LIMIT_BUILD_TOKENS (25) tokens per minute per IP, shared
+    across workers. A cache hit costs 1 token, an LLM call LLM_CALL_WEIGHT (5).
     """
     try:
         result = await DesignService.build_graph(
             payload.system_name, 
             return_diff=diff,
-            use_cache=payload.use_cache
+            use_cache=payload.use_cache,
+            speculate=payload.speculate
         )
         return result
+    except (CircuitOpenError, LLMOverloadedError):
+        raise  # 503 + Retry-After via the app's exception handlers
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/expand-node")
-@limiter.limit("10/minute")  # Slightly more permissive
+@router.post("/build-graph/batch")
+@limiter.limit("2/minute")  # One request can fan out to many LLM calls
+async def build_graph_batch(request: Request, payload: BatchBuildGraphRequest):
+    """
+    Build graphs for many systems in one request.
+    
+    Streams newline-delimited JSON: one item per system as it completes,
+    followed by a final summary once all snapshots are saved.
+    
+    Rate limit: 2 requests per minute per IP, and charged to the same token
+    budget as /build-graph: 1 token to start, LLM_CALL_WEIGHT per LLM call.
+    """
+    if not payload.system_names:
+        raise HTTPException(status_code=400, detail="system_names must not be empty")
+    if len(payload.system_names) > BATCH_MAX_SYSTEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_SYSTEMS} systems per batch"
+        )
+
+    concurrency = min(
+        payload.max_concurrency or BATCH_LLM_CONCURRENCY,
+        BATCH_LLM_CONCURRENCY
+    )
+    charge_tokens(request, "build", RATE_LIMIT_BUILD_TOKENS)
+
+    async def stream():
+        # The LLM calls happen while streaming, after the handler has returned
+        usage = track_llm_calls()
+        try:
+            async for item in DesignService.build_graphs_batch(
+                payload.system_names,
+                use_cache=payload.use_cache,
+                max_concurrency=max(concurrency, 1)
+            ):
+                yield json.dumps(item) + "\n"
+        finally:
+            charge_llm_calls(request, "build", RATE_LIMIT_BUILD_TOKENS, usage)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/expand-node",
+    dependencies=[Depends(cost_aware_limit("expand", RATE_LIMIT_EXPAND_TOKENS))]
+)
 async def expand_node(
-    request: Request,  # Required for rate limiter
+    request: Request,
     payload: ExpandNodeRequest,
     diff: bool = Query(False, description="Return only changes from previous version")
 ):
     """
     Expand a single node into subgraph.
     
-    Rate limit: 10 requests per minute per IP
+    Rate limit: RATE_LIMIT_EXPAND_TOKENS (50) tokens per minute per IP, shared
+    across workers. A cache hit costs 1 token, an LLM call LLM_CALL_WEIGHT (5).
     """
     try:
         result = await DesignService.expand_node(
@@ -60,12 +144,156 @@ async def expand_node(
             return_diff=diff
         )
         return result
+    except (CircuitOpenError, LLMOverloadedError):
+        raise  # 503 + Retry-After via the app's exception handlers
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post(
+    "/expand-nodes",
+    dependencies=[Depends(cost_aware_limit("expand", RATE_LIMIT_EXPAND_TOKENS))]
+)
+async def expand_nodes(
+    request: Request,
+    payload: ExpandNodesRequest,
+    diff: bool = Query(False, description="Return only changes from previous version")
+):
+    """
+    Expand several nodes into one new version.
+    
+    Uncached nodes are requested from the LLM together (up to
+    EXPAND_BATCH_MAX_NODES per call) and each node's result is cached as if
+    it had been expanded on its own. Per-node failures are listed under
+    `failed`; the request only fails if no node could be expanded.
+    """
+    if not payload.nodes:
+        raise HTTPException(status_code=400, detail="nodes must not be empty")
+    if len(payload.nodes) > EXPAND_MAX_NODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {EXPAND_MAX_NODES} nodes per request"
+        )
+
+    try:
+        return await DesignService.expand_nodes(
+            system=payload.system,
+            nodes=[n.model_dump() for n in payload.nodes],
+            max_depth=payload.max_depth,
+            return_diff=diff
+        )
+    except (CircuitOpenError, LLMOverloadedError):
+        raise  # 503 + Retry-After via the app's exception handlers
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _expected_job_cost(prompt: str, use_cache: bool = True) -> int:
+    """Tokens to charge when queueing: 1 if the result is cached, else an LLM call"""
+    if use_cache and get_cached_responses([prompt])[0] is not None:
+        return 1
+    return LLM_CALL_WEIGHT
+
+
+@router.post("/jobs/build-graph", status_code=202, response_model=JobSubmitResponse)
+async def submit_build_graph_job(
+    request: Request,
+    payload: BuildGraphRequest,
+    diff: bool = Query(False, description="Return only changes from previous version")
+):
+    """
+    Queue a graph build and return a job id immediately.
+    
+    Identical pending jobs are deduplicated. Poll `/jobs/{job_id}` or
+    subscribe to `/jobs/{job_id}/events` for the result.
+    
+    Rate limit: the /build-graph token budget, charged at submit time with
+    the expected weight (1 if cached, LLM_CALL_WEIGHT otherwise).
+    """
+    charge_tokens(
+        request,
+        "build",
+        RATE_LIMIT_BUILD_TOKENS,
+        _expected_job_cost(build_prompt(payload.system_name), payload.use_cache)
+    )
+    job, deduplicated = await job_queue.submit("build_graph", {
+        "system_name": payload.system_name,
+        "return_diff": diff,
+        "use_cache": payload.use_cache,
+        "speculate": payload.speculate
+    })
+    return {"job_id": job["id"], "status": job["status"], "deduplicated": deduplicated}
+
+
+@router.post("/jobs/expand-node", status_code=202, response_model=JobSubmitResponse)
+async def submit_expand_node_job(
+    request: Request,
+    payload: ExpandNodeRequest,
+    diff: bool = Query(False, description="Return only changes from previous version")
+):
+    """
+    Queue a node expansion and return a job id immediately.
+    
+    Rate limit: the /expand-node token budget, charged at submit time with
+    the expected weight.
+    """
+    charge_tokens(
+        request,
+        "expand",
+        RATE_LIMIT_EXPAND_TOKENS,
+        _expected_job_cost(build_prompt(f"{payload.system}::{payload.node_label}"))
+    )
+    job, deduplicated = await job_queue.submit("expand_node", {
+        "system": payload.system,
+        "node_id": payload.node_id,
+        "node_label": payload.node_label,
+        "max_depth": payload.max_depth,
+        "return_diff": diff
+    })
+    return {"job_id": job["id"], "status": job["status"], "deduplicated": deduplicated}
+
+
+@router.get("/jobs/{job_id}")
+@limiter.limit("120/minute")  # Cheap status reads, clients poll this
+async def get_job(
+    request: Request,
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Long-poll up to N seconds for completion")
+):
+    """
+    Get job status, and the result once it has succeeded.
+    """
+    if wait:
+        job = await job_queue.wait(job_id, timeout=wait)
+    else:
+        job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def subscribe_job(request: Request, job_id: str):
+    """
+    Subscribe to job status changes as server-sent events.
+    
+    The stream ends once the job succeeds or fails.
+    """
+    if not await job_queue.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for job in job_queue.watch(job_id, timeout=300):
+            yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
 @router.get("/load-latest/{system}")
 @limiter.limit("30/minute")  # More permissive for read-only
-async def load_latest(request: Request, system: str):
+async def load_latest(
+    request: Request,
+    system: str,
+    layout: bool = Query(True, description="Include precomputed x/y node positions")
+):
     """
     Load latest saved graph.
     
@@ -74,8 +302,202 @@ async def load_latest(request: Request, system: str):
     state = SnapshotService.load_latest(system)
     if not state:
         return {"message": "No saved graph found"}
+    if layout:
+        await asyncio.to_thread(LayoutService.attach, state)
     return state
 
+def _get_index_or_404(system: str, version: int | None):
+    index = GraphQueryService.get_index(system, version)
+    if index is None:
+        raise HTTPException(status_code=404, detail="No saved graph found")
+    return index
+
+
+def _node_filters(level_min: int | None, level_max: int | None, types: str | None) -> dict:
+    return {
+        "level_min": level_min,
+        "level_max": level_max,
+        "types": {t.strip() for t in types.split(",") if t.strip()} if types else None
+    }
+
+
+@router.get("/graph/{system}/neighborhood")
+@limiter.limit("60/minute")
+async def graph_neighborhood(
+    request: Request,
+    system: str,
+    node_id: str,
+    k: int = Query(1, ge=0, le=5, description="Number of hops"),
+    direction: str = Query("both", pattern="^(in|out|both)$"),
+    version: int | None = Query(None, description="Snapshot version (latest if omitted)")
+):
+    """
+    Nodes within k hops of a node, and the edges between them.
+    
+    Rate limit: 60 requests per minute per IP
+    """
+    index = _get_index_or_404(system, version)
+    try:
+        result = index.neighborhood(node_id, k=k, direction=direction)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Node not found: {node_id}")
+    return {"system": index.system, "version": index.version, **result}
+
+
+@router.get("/graph/{system}/nodes")
+@limiter.limit("60/minute")
+async def graph_nodes(
+    request: Request,
+    system: str,
+    level_min: int | None = None,
+    level_max: int | None = None,
+    types: str | None = Query(None, description="Comma-separated node types"),
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=GRAPH_QUERY_MAX_PAGE),
+    version: int | None = Query(None, description="Snapshot version (latest if omitted)")
+):
+    """
+    Cursor-paginated node listing with level range and type filters.
+    
+    Rate limit: 60 requests per minute per IP
+    """
+    index = _get_index_or_404(system, version)
+    try:
+        return index.page_nodes(cursor, limit, **_node_filters(level_min, level_max, types))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/graph/{system}/edges")
+@limiter.limit("60/minute")
+async def graph_edges(
+    request: Request,
+    system: str,
+    level_min: int | None = None,
+    level_max: int | None = None,
+    types: str | None = Query(None, description="Only edges between nodes of these types"),
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=GRAPH_QUERY_MAX_PAGE),
+    version: int | None = Query(None, description="Snapshot version (latest if omitted)")
+):
+    """
+    Cursor-paginated edge listing. With filters, only edges whose endpoints
+    both match are returned.
+    
+    Rate limit: 60 requests per minute per IP
+    """
+    index = _get_index_or_404(system, version)
+    try:
+        return index.page_edges(cursor, limit, **_node_filters(level_min, level_max, types))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _send_snapshot(websocket: WebSocket, system: str) -> int:
+    """Send the full latest graph; returns its version (0 if none saved)"""
+    state = SnapshotService.load_latest(system)
+    if not state:
+        await websocket.send_json({"type": "empty", "system": system, "version": 0})
+        return 0
+    await asyncio.to_thread(LayoutService.attach, state)
+    await websocket.send_json({
+        "type": "snapshot",
+        "system": system,
+        "version": state["version"],
+        "nodes": state["nodes"],
+        "edges": state["edges"],
+        "metadata": state["metadata"]
+    })
+    return state["version"]
+
+
+async def _catch_up(websocket: WebSocket, system: str, since_version: int | None) -> int:
+    """Replay missed diffs from the event history, or fall back to a snapshot"""
+    if since_version is None:
+        return await _send_snapshot(websocket, system)
+
+    last_version = since_version
+    for event in get_history(system):
+        if event["version"] <= last_version:
+            continue
+        if event["type"] != "diff" or event["base_version"] != last_version:
+            break  # Gap in the history
+        await websocket.send_json(event)
+        last_version = event["version"]
+
+    latest = SnapshotService.latest_versions([system]).get(system, 0)
+    if latest != last_version:
+        return await _send_snapshot(websocket, system)
+    return last_version
+
+
+async def _drain_client(websocket: WebSocket):
+    """Consume client messages so a disconnect is noticed promptly"""
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/ws/graph/{system}")
+async def graph_updates(websocket: WebSocket, system: str):
+    """
+    Stream graph changes for a system.
+    
+    Handshake: the client may send {"since_version": n} within 5 seconds to
+    resume; missed diffs are replayed, or a full snapshot is sent if they are
+    no longer available. Afterwards every saved version arrives as a "diff"
+    (additive expansions) or a "snapshot" (rebuilds, or anything that removed
+    nodes or edges) message. A client that falls too far behind gets a fresh
+    snapshot instead of its dropped backlog.
+    """
+    await websocket.accept()
+    subscription = await graph_event_hub.subscribe(system)
+    receiver = None
+    try:
+        since_version = None
+        try:
+            hello = await asyncio.wait_for(websocket.receive_json(), timeout=5)
+            if isinstance(hello, dict) and isinstance(hello.get("since_version"), int):
+                since_version = hello["since_version"]
+        except asyncio.TimeoutError:
+            pass
+
+        last_version = await _catch_up(websocket, system, since_version)
+        receiver = asyncio.create_task(_drain_client(websocket))
+
+        while not receiver.done():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=1)
+            except asyncio.TimeoutError:
+                event = None
+
+            if subscription.take_overflow():
+                last_version = await _send_snapshot(websocket, system)
+                continue
+            if event is None or event["version"] <= last_version:
+                continue
+            if event["type"] == "diff" and event["base_version"] != last_version:
+                last_version = await _send_snapshot(websocket, system)
+                continue
+
+            await websocket.send_json(event)
+            last_version = event["version"]
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if receiver:
+            receiver.cancel()
+        await graph_event_hub.unsubscribe(subscription)
+
+
+@router.delete("/speculation/{system}")
+async def cancel_speculation(request: Request, system: str):
+    """Stop background pre-expansion for a system on any worker (e.g. the user navigated away)"""
+    return {"system": system, "cancelled": speculator.cancel(system)}
+
+
 @router.get("/stats")
 async def get_stats(request: Request):
     """
@@ -85,6 +507,9 @@ async def get_stats(request: Request):
     """
     return {
         "llm_usage": cost_monitor.get_stats(),
+        "daily_cost": cost_monitor.get_daily_history(),
+        "last_warmup": cache_warmer.last_report,
+        "last_snapshot_prune": snapshot_pruner.last_report,
         "status": "operational"
     }
 
@@ -116,5 +541,12 @@ async def get_metrics(request: Request):
             "misses": cache_misses,
             "hit_rate_percent": round(hit_rate, 2)
         },
+        "jobs": await job_queue.get_stats(),
+        "llm_circuit": llm_breaker.get_stats(),
+        "llm_backends": llm_router.get_stats(),
+        "llm_concurrency": llm_concurrency.get_stats(),
+        "graph_index": GraphQueryService.get_stats(),
+        "graph_subscriptions": graph_event_hub.get_stats(),
+        "speculation": speculator.get_stats(),
         "status": "operational"
     }
\ No newline at end of file
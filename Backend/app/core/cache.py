@@ -1,24 +1,140 @@
 import redis
 import json
 import hashlib
+import time
+from datetime import datetime, timedelta
+from app.core.config import REDIS_URL, CACHE_SOFT_TTL, CACHE_HARD_TTL, NEGATIVE_CACHE_TTL
 
-redis_client = redis.Redis(
-    host="localhost",
-    port=6379,
-    decode_responses=True
-)
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
 
 def make_cache_key(prompt: str) -> str:
     digest = hashlib.sha256(prompt.encode()).hexdigest()
     return f"llm:{digest}"
 
-def get_cached_response(prompt: str):
+# Entries are wrapped as {"response": ..., "fresh_until": ts}. Redis drops the
+# key at the hard TTL; between fresh_until and then the entry is served stale.
+
+def _unwrap(value: str):
+    entry = json.loads(value)
+    if isinstance(entry, dict) and "fresh_until" in entry and "response" in entry:
+        return entry["response"], time.time() > entry["fresh_until"]
+    return entry, False  # Entry written before soft TTLs existed
+
+# GET plus a hit count that is only bumped when the entry exists, so misses
+# neither leave orphan :hits keys nor count towards CACHE_REFRESH_MIN_HITS
+GET_AND_COUNT_LUA = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return nil
+end
+local hits = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return {value, hits}
+"""
+
+_get_and_count = redis_client.register_script(GET_AND_COUNT_LUA)
+
+def get_cached_entry(prompt: str):
+    """
+    Look up a cached response and count the access.
+
+    Returns:
+        (response, is_stale, access_count) or None on a miss
+    """
     key = make_cache_key(prompt)
-    value = redis_client.get(key)
-    if value:
-        return json.loads(value)
-    return None
+    found = _get_and_count(keys=[key, f"{key}:hits"], args=[CACHE_HARD_TTL])
+    if not found:
+        return None
+    value, hits = found
+    response, stale = _unwrap(value)
+    return response, stale, hits
+
+def get_cached_response(prompt: str):
+    entry = get_cached_entry(prompt)
+    return entry[0] if entry else None
 
-def set_cached_response(prompt: str, response: dict, ttl: int = 86400):
+def set_cached_response(
+    prompt: str,
+    response: dict,
+    ttl: int = CACHE_HARD_TTL,
+    soft_ttl: int = CACHE_SOFT_TTL
+):
     key = make_cache_key(prompt)
-    redis_client.setex(key, ttl, json.dumps(response))
+    entry = {"response": response, "fresh_until": time.time() + min(soft_ttl, ttl)}
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.setex(key, ttl, json.dumps(entry))
+    pipe.delete(f"{key}:hits")  # Hotness is measured per generation
+    pipe.execute()
+
+def get_cached_responses(prompts: list) -> list:
+    """Fetch many cached responses in a single pipelined round-trip"""
+    pipe = redis_client.pipeline(transaction=False)
+    for prompt in prompts:
+        pipe.get(make_cache_key(prompt))
+    values = pipe.execute()
+    return [_unwrap(value)[0] if value else None for value in values]
+
+def get_warm_responses(prompts: list, min_ttl: int = 0) -> list:
+    """
+    Like get_cached_responses, but entries that are stale or expire within
+    `min_ttl` seconds count as misses (None)
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for prompt in prompts:
+        key = make_cache_key(prompt)
+        pipe.get(key)
+        pipe.ttl(key)
+    values = pipe.execute()
+    warm = []
+    for value, ttl in zip(values[::2], values[1::2]):
+        if not value or 0 <= ttl < min_ttl:
+            warm.append(None)
+            continue
+        response, stale = _unwrap(value)
+        warm.append(None if stale else response)
+    return warm
+
+def claim_refresh(prompt: str, ttl: int = 120) -> bool:
+    """Only one worker across the cluster refreshes a given stale entry"""
+    return bool(redis_client.set(f"{make_cache_key(prompt)}:refresh", 1, nx=True, ex=ttl))
+
+def release_refresh(prompt: str):
+    redis_client.delete(f"{make_cache_key(prompt)}:refresh")
+
+def get_negative_entry(prompt: str) -> str | None:
+    """Error message recorded for a prompt that deterministically fails"""
+    return redis_client.get(f"{make_cache_key(prompt)}:failed")
+
+def set_negative_entry(prompt: str, error: str, ttl: int = NEGATIVE_CACHE_TTL):
+    redis_client.setex(f"{make_cache_key(prompt)}:failed", ttl, error)
+
+# System names are user input: counts are bucketed per UTC day, expire, and
+# each day is trimmed back to its most requested names
+REQUEST_STATS_DAYS = 7
+REQUEST_STATS_MAX_ENTRIES = 1000
+
+def _request_stats_key(day: datetime) -> str:
+    return f"stats:system_requests:{day:%Y-%m-%d}"
+
+def record_system_request(system_name: str):
+    """Count a build request so popular systems can be warmed ahead of time"""
+    key = _request_stats_key(datetime.utcnow())
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.zincrby(key, 1, system_name)
+    pipe.zcard(key)
+    pipe.expire(key, REQUEST_STATS_DAYS * 86400)
+    _, count, _ = pipe.execute()
+    if count > 2 * REQUEST_STATS_MAX_ENTRIES:
+        redis_client.zremrangebyrank(key, 0, -(REQUEST_STATS_MAX_ENTRIES + 1))
+
+def get_top_systems(limit: int) -> list:
+    """Most-requested system names over the last REQUEST_STATS_DAYS days, most popular first"""
+    today = datetime.utcnow()
+    pipe = redis_client.pipeline(transaction=False)
+    for days_ago in range(REQUEST_STATS_DAYS):
+        pipe.zrange(_request_stats_key(today - timedelta(days=days_ago)), 0, -1, withscores=True)
+    totals = {}
+    for day in pipe.execute():
+        for name, count in day:
+            totals[name] = totals.get(name, 0) + count
+    return sorted(totals, key=lambda name: (-totals[name], name))[:limit]
@@ -0,0 +1,138 @@
+import time
+from collections import deque
+
+from app.core.config import (
+    BREAKER_WINDOW_SECONDS,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATE,
+    BREAKER_OPEN_SECONDS,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency that is known to be failing"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable (circuit open)")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker.
+
+    closed    - calls flow; outcomes are recorded in a sliding time window
+    open      - calls fail fast until `open_seconds` have passed
+    half_open - a single probe call is let through; success closes, failure reopens
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        open_seconds: float = 30,
+        clock=time.monotonic
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.clock = clock
+
+        self.state = "closed"
+        self.outcomes = deque()  # (timestamp, succeeded)
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call should not be attempted"""
+        if self.state == "open":
+            elapsed = self.clock() - self.opened_at
+            if elapsed < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.open_seconds - elapsed)
+            self.state = "half_open"
+
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 1)
+            self.probe_in_flight = True
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected outright (no side effects)"""
+        return self.state == "open" and self.clock() - self.opened_at < self.open_seconds
+
+    def retry_after(self) -> float:
+        if self.state != "open":
+            return 0.0
+        return max(self.open_seconds - (self.clock() - self.opened_at), 0.0)
+
+    def record_success(self):
+        if self.state == "half_open":
+            self._close()
+            return
+        self._record(True)
+
+    def record_failure(self):
+        if self.state == "half_open":
+            self._open()
+            return
+        self._record(False)
+
+        total = len(self.outcomes)
+        failures = sum(1 for _, ok in self.outcomes if not ok)
+        if total >= self.min_calls and failures / total >= self.failure_rate:
+            self._open()
+
+    def release(self):
+        """Call was abandoned (e.g. cancelled) without a verdict on the dependency"""
+        self.probe_in_flight = False
+
+    def _record(self, succeeded: bool):
+        now = self.clock()
+        self.outcomes.append((now, succeeded))
+        while self.outcomes and now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = self.clock()
+        self.probe_in_flight = False
+        self.outcomes.clear()
+        self.times_opened += 1
+        print(f"🚨 Circuit '{self.name}' opened")
+
+    def _close(self):
+        self.state = "closed"
+        self.probe_in_flight = False
+        self.outcomes.clear()
+        print(f"✅ Circuit '{self.name}' closed")
+
+    def get_stats(self) -> dict:
+        total = len(self.outcomes)
+        failures = sum(1 for _, ok in self.outcomes if not ok)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failure_rate": round(failures / total, 3) if total else 0.0,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected,
+            "retry_after_s": round(self.retry_after(), 1)
+        }
+
+
+# Global instance guarding the LLM provider
+llm_breaker = CircuitBreaker(
+    "llm",
+    window_seconds=BREAKER_WINDOW_SECONDS,
+    min_calls=BREAKER_MIN_CALLS,
+    failure_rate=BREAKER_FAILURE_RATE,
+    open_seconds=BREAKER_OPEN_SECONDS
+)
@@ -10,3 +10,94 @@ def get_groq_key():
     if not key:
         raise RuntimeError("GROQ_API_KEY is not set")
     return key
+
+# Batch build-graph settings
+BATCH_MAX_SYSTEMS = int(os.getenv("BATCH_MAX_SYSTEMS", "100"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+# Multi-node expansion: nodes per request, and per LLM call
+EXPAND_MAX_NODES = int(os.getenv("EXPAND_MAX_NODES", "20"))
+EXPAND_BATCH_MAX_NODES = int(os.getenv("EXPAND_BATCH_MAX_NODES", "6"))
+
+# Background job queue settings
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "redis")  # redis | memory
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))  # Renewed while a job runs
+
+# Cache warming settings
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+WARMUP_HOUR_UTC = int(os.getenv("WARMUP_HOUR_UTC", "3"))  # Off-peak run time
+WARMUP_TOP_SYSTEMS = int(os.getenv("WARMUP_TOP_SYSTEMS", "50"))
+WARMUP_SEED_FILE = os.getenv("WARMUP_SEED_FILE")
+WARMUP_EXPAND_NODES = os.getenv("WARMUP_EXPAND_NODES", "false").lower() == "true"
+WARMUP_CALLS_PER_MINUTE = int(os.getenv("WARMUP_CALLS_PER_MINUTE", "20"))
+WARMUP_MAX_COST = float(os.getenv("WARMUP_MAX_COST", "1.0"))
+
+# LLM cache TTLs: fresh until soft, served stale (and refreshed if hot) until hard
+CACHE_SOFT_TTL = int(os.getenv("CACHE_SOFT_TTL", "64800"))  # 18h
+CACHE_HARD_TTL = int(os.getenv("CACHE_HARD_TTL", "86400"))  # 24h
+CACHE_REFRESH_MIN_HITS = int(os.getenv("CACHE_REFRESH_MIN_HITS", "3"))
+
+# LLM circuit breaker and negative caching
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "300"))
+
+# Redis shared by the LLM cache, job queue and rate limiters
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Cost-aware rate limits: a request costs 1 token, plus LLM_CALL_WEIGHT - 1
+# more if it actually reached the LLM (cache hits stay cheap)
+LLM_CALL_WEIGHT = int(os.getenv("LLM_CALL_WEIGHT", "5"))
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+RATE_LIMIT_BUILD_TOKENS = int(os.getenv("RATE_LIMIT_BUILD_TOKENS", "25"))
+RATE_LIMIT_EXPAND_TOKENS = int(os.getenv("RATE_LIMIT_EXPAND_TOKENS", "50"))
+
+# Global cap on in-flight LLM calls across all workers
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+# Seconds a slot outlives the slowest routed call (primary timeout + failover)
+LLM_SLOT_LEASE_SLACK = float(os.getenv("LLM_SLOT_LEASE_SLACK", "15"))
+
+# LLM cost accounting (USD)
+COST_BUDGET_USD = float(os.getenv("COST_BUDGET_USD", "10.0"))  # Per UTC day
+COST_PER_CALL_USD = float(os.getenv("COST_PER_CALL_USD", "0.001"))  # When usage is missing
+LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", "0.075"))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", "0.30"))
+
+# Server-side graph layout: layered | force | none
+GRAPH_LAYOUT = os.getenv("GRAPH_LAYOUT", "layered")
+LAYOUT_FORCE_MAX_NODES = int(os.getenv("LAYOUT_FORCE_MAX_NODES", "1500"))
+LAYOUT_CACHE_TTL = int(os.getenv("LAYOUT_CACHE_TTL", "604800"))  # 7 days
+
+# Graph query API
+GRAPH_INDEX_CACHE_SIZE = int(os.getenv("GRAPH_INDEX_CACHE_SIZE", "64"))
+GRAPH_QUERY_MAX_PAGE = int(os.getenv("GRAPH_QUERY_MAX_PAGE", "500"))
+
+# Real-time graph updates over WebSocket
+GRAPH_EVENT_HISTORY = int(os.getenv("GRAPH_EVENT_HISTORY", "50"))  # Events kept for resume
+GRAPH_EVENT_QUEUE_SIZE = int(os.getenv("GRAPH_EVENT_QUEUE_SIZE", "32"))  # Per-subscriber backlog
+
+# Speculative pre-expansion after build-graph (opt-in per request)
+SPECULATION_TOP_N = int(os.getenv("SPECULATION_TOP_N", "3"))  # 0 disables speculation
+SPECULATIVE_BUDGET_USD = float(os.getenv("SPECULATIVE_BUDGET_USD", "1.0"))  # Per day
+
+# LLM backends: JSON list of OpenAI-compatible endpoints, e.g.
+# [{"name": "groq", "url": "...", "model": "...", "api_key_env": "GROQ_API_KEY"}]
+# Empty means the single built-in Groq backend
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "")
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # Before p90 is trusted
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "5.0"))  # Seconds, until then
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))  # Samples kept per backend
+
+# Snapshot retention: keep the last N versions per system, plus the last
+# snapshot of each day for SNAPSHOT_CHECKPOINT_DAYS; prune the rest in batches
+SNAPSHOT_RETENTION_ENABLED = os.getenv("SNAPSHOT_RETENTION_ENABLED", "false").lower() == "true"
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv("SNAPSHOT_KEEP_VERSIONS", "20"))
+SNAPSHOT_CHECKPOINT_DAYS = int(os.getenv("SNAPSHOT_CHECKPOINT_DAYS", "90"))
+SNAPSHOT_PRUNE_BATCH = int(os.getenv("SNAPSHOT_PRUNE_BATCH", "500"))  # Rows per DELETE
+SNAPSHOT_PRUNE_INTERVAL = int(os.getenv("SNAPSHOT_PRUNE_INTERVAL", "3600"))  # Seconds
+SNAPSHOT_PARTITION_MONTHS_AHEAD = int(os.getenv("SNAPSHOT_PARTITION_MONTHS_AHEAD", "2"))
@@ -1,37 +1,191 @@
-import time
-from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 
+from app.core.cache import redis_client
+from app.core.config import (
+    COST_BUDGET_USD,
+    SPECULATIVE_BUDGET_USD,
+    COST_PER_CALL_USD,
+    LLM_INPUT_COST_PER_MTOK,
+    LLM_OUTPUT_COST_PER_MTOK,
+)
+
+HOURLY_RETENTION = 48 * 3600  # Hourly buckets live two days
+DAILY_RETENTION = 90 * 86400  # Daily aggregates live three months
+BY_SYSTEM_RETENTION = 7 * 86400  # Per-system daily rankings live a week
+# System names are user input: once a day's ranking passes twice this size it
+# is trimmed back to the top spenders (the slack lets newcomers accumulate)
+BY_SYSTEM_MAX_ENTRIES = 1000
+
+# Spend of the current track_spend() block, if any (inherited by tasks it starts)
+_tracked_spend: ContextVar[dict | None] = ContextVar("tracked_spend", default=None)
+
+
 class CostMonitor:
-    """Track LLM usage and costs"""
-    
-    def __init__(self):
-        self.calls = defaultdict(int)  # Track calls per hour
-        self.total_calls = 0
-        self.estimated_cost = 0.0
-        
-        # Groq pricing (example - adjust based on actual pricing)
-        self.cost_per_call = 0.001  # $0.001 per call
-    
-    def record_call(self, system_name: str):
-        """Record an LLM call"""
-        hour_key = datetime.now().strftime("%Y-%m-%d-%H")
-        self.calls[hour_key] += 1
-        self.total_calls += 1
-        self.estimated_cost += self.cost_per_call
-    
+    """
+    Track LLM usage and costs in Redis so every worker shares one budget.
+
+    The budget (COST_BUDGET_USD) applies per UTC day. Each call atomically
+    updates:
+        cost:total          - lifetime calls, tokens and USD
+        cost:hour:<hour>    - hourly bucket (expires after HOURLY_RETENTION)
+        cost:day:<day>      - daily aggregate the hourly buckets roll up into
+        cost:by_model       - USD per model
+        cost:by_system:<day> - USD per system (sorted set, trimmed to the top spenders)
+        cost:speculative:<day> - speculative pre-expansion spend, budgeted separately
+        cost:hedged:<day>   - spend on the losing half of hedged LLM requests
+    """
+
+    TOTAL_KEY = "cost:total"
+
+    def __init__(self, client=redis_client):
+        self.client = client
+
+        # Fallback when a response carries no usage field
+        self.cost_per_call = COST_PER_CALL_USD
+
+    def compute_cost(self, usage: dict | None) -> float:
+        """Token-based cost from an OpenAI-style usage field"""
+        if not usage:
+            return self.cost_per_call
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        return (
+            prompt_tokens * LLM_INPUT_COST_PER_MTOK
+            + completion_tokens * LLM_OUTPUT_COST_PER_MTOK
+        ) / 1_000_000
+
+    def record_call(
+        self,
+        system_name: str,
+        model: str = "unknown",
+        usage: dict | None = None,
+        speculative: bool = False,
+        hedged: bool = False
+    ) -> float:
+        """Record an LLM call; returns its cost in USD"""
+        cost = self.compute_cost(usage)
+        prompt_tokens = (usage or {}).get("prompt_tokens", 0)
+        completion_tokens = (usage or {}).get("completion_tokens", 0)
+
+        now = datetime.utcnow()
+        hour_key = f"cost:hour:{now.strftime('%Y-%m-%d-%H')}"
+        day_key = f"cost:day:{now.strftime('%Y-%m-%d')}"
+
+        pipe = self.client.pipeline(transaction=True)
+        for key in (self.TOTAL_KEY, hour_key, day_key):
+            pipe.hincrby(key, "calls", 1)
+            pipe.hincrby(key, "prompt_tokens", prompt_tokens)
+            pipe.hincrby(key, "completion_tokens", completion_tokens)
+            pipe.hincrbyfloat(key, "usd", cost)
+        pipe.expire(hour_key, HOURLY_RETENTION)
+        pipe.expire(day_key, DAILY_RETENTION)
+        pipe.hincrbyfloat("cost:by_model", model, cost)
+        by_system_key = f"cost:by_system:{now.strftime('%Y-%m-%d')}"
+        pipe.zincrby(by_system_key, cost, system_name)
+        ranked_index = len(pipe)
+        pipe.zcard(by_system_key)
+        pipe.expire(by_system_key, BY_SYSTEM_RETENTION)
+        if speculative:
+            spec_key = f"cost:speculative:{now.strftime('%Y-%m-%d')}"
+            pipe.hincrby(spec_key, "calls", 1)
+            pipe.hincrbyfloat(spec_key, "usd", cost)
+            pipe.expire(spec_key, DAILY_RETENTION)
+        if hedged:
+            hedge_key = f"cost:hedged:{now.strftime('%Y-%m-%d')}"
+            pipe.hincrby(hedge_key, "calls", 1)
+            pipe.hincrbyfloat(hedge_key, "usd", cost)
+            pipe.expire(hedge_key, DAILY_RETENTION)
+        results = pipe.execute()
+
+        if results[ranked_index] > 2 * BY_SYSTEM_MAX_ENTRIES:
+            self.client.zremrangebyrank(by_system_key, 0, -(BY_SYSTEM_MAX_ENTRIES + 1))
+
+        spend = _tracked_spend.get()
+        if spend is not None:
+            spend["calls"] += 1
+            spend["usd"] += cost
+        return cost
+
+    @contextmanager
+    def track_spend(self):
+        """
+        Sum the LLM calls made inside this block, e.g. by one warmup run.
+
+        Yields {"calls", "usd"}, updated as calls are recorded; calls made
+        concurrently by other requests are not included.
+        """
+        spend = {"calls": 0, "usd": 0.0}
+        token = _tracked_spend.set(spend)
+        try:
+            yield spend
+        finally:
+            _tracked_spend.reset(token)
+
+    def cost_today(self) -> float:
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        return float(self.client.hget(f"cost:day:{day}", "usd") or 0)
+
+    def speculative_cost_today(self) -> float:
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        return float(self.client.hget(f"cost:speculative:{day}", "usd") or 0)
+
+    @property
+    def estimated_cost(self) -> float:
+        return float(self.client.hget(self.TOTAL_KEY, "usd") or 0)
+
     def get_stats(self) -> dict:
         """Get current usage statistics"""
-        current_hour = datetime.now().strftime("%Y-%m-%d-%H")
+        now = datetime.utcnow()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self.TOTAL_KEY)
+        pipe.hgetall(f"cost:hour:{now.strftime('%Y-%m-%d-%H')}")
+        pipe.hgetall(f"cost:day:{now.strftime('%Y-%m-%d')}")
+        pipe.hgetall("cost:by_model")
+        pipe.zrevrange(f"cost:by_system:{now.strftime('%Y-%m-%d')}", 0, 9, withscores=True)
+        pipe.hgetall(f"cost:hedged:{now.strftime('%Y-%m-%d')}")
+        total, hour, day, by_model, top_systems, hedged = pipe.execute()
+
         return {
-            "total_calls": self.total_calls,
-            "calls_this_hour": self.calls[current_hour],
-            "estimated_cost_usd": round(self.estimated_cost, 4)
+            "total_calls": int(total.get("calls", 0)),
+            "calls_this_hour": int(hour.get("calls", 0)),
+            "calls_today": int(day.get("calls", 0)),
+            "prompt_tokens": int(total.get("prompt_tokens", 0)),
+            "completion_tokens": int(total.get("completion_tokens", 0)),
+            "estimated_cost_usd": round(float(total.get("usd", 0)), 4),
+            "cost_today_usd": round(float(day.get("usd", 0)), 4),
+            "speculative_cost_today_usd": round(self.speculative_cost_today(), 4),
+            "hedged_calls_today": int(hedged.get("calls", 0)),
+            "hedged_cost_today_usd": round(float(hedged.get("usd", 0)), 4),
+            "daily_budget_usd": COST_BUDGET_USD,
+            "cost_by_model_usd": {m: round(float(v), 4) for m, v in by_model.items()},
+            "top_systems_today_usd": {s: round(v, 4) for s, v in top_systems}
         }
-    
-    def check_budget_limit(self, max_cost: float = 10.0) -> bool:
-        """Check if we're within budget"""
-        return self.estimated_cost < max_cost
+
+    def get_daily_history(self, days: int = 7) -> list:
+        """Daily aggregates, most recent first"""
+        today = datetime.utcnow().date()
+        dates = [(today - timedelta(days=i)).isoformat() for i in range(days)]
+        pipe = self.client.pipeline(transaction=False)
+        for date in dates:
+            pipe.hgetall(f"cost:day:{date}")
+        return [
+            {
+                "date": date,
+                "calls": int(day.get("calls", 0)),
+                "usd": round(float(day.get("usd", 0)), 4)
+            }
+            for date, day in zip(dates, pipe.execute())
+        ]
+
+    def check_budget_limit(self, max_cost: float = COST_BUDGET_USD) -> bool:
+        """Check if today's spend is within budget (a single Redis read)"""
+        return self.cost_today() < max_cost
+
+    def check_speculative_budget(self, max_cost: float = SPECULATIVE_BUDGET_USD) -> bool:
+        """Speculation gets its own daily cap, on top of the global budget"""
+        return self.speculative_cost_today() < max_cost and self.check_budget_limit()
 
 # Global instance
 cost_monitor = CostMonitor()
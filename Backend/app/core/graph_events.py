@@ -0,0 +1,138 @@
+import asyncio
+import json
+from collections import defaultdict
+
+import redis.asyncio as aioredis
+
+from app.core.cache import redis_client
+from app.core.config import REDIS_URL, GRAPH_EVENT_HISTORY, GRAPH_EVENT_QUEUE_SIZE
+
+
+def channel_name(system: str) -> str:
+    return f"graph:events:{system}"
+
+
+def history_key(system: str) -> str:
+    return f"graph:history:{system}"
+
+
+def publish_event(event: dict):
+    """
+    Publish a graph change to every worker, and keep it in a short
+    per-system history so reconnecting clients can resume.
+    """
+    system = event["system"]
+    payload = json.dumps(event)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.rpush(history_key(system), payload)
+    pipe.ltrim(history_key(system), -GRAPH_EVENT_HISTORY, -1)
+    pipe.expire(history_key(system), 86400)
+    pipe.publish(channel_name(system), payload)
+    pipe.execute()
+
+
+def get_history(system: str) -> list:
+    """Recent events for a system, oldest first"""
+    return [json.loads(e) for e in redis_client.lrange(history_key(system), 0, -1)]
+
+
+class Subscription:
+    """One WebSocket's view of a system's event stream"""
+
+    def __init__(self, system: str, max_queued: int):
+        self.system = system
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.overflowed = False
+
+    def offer(self, event: dict):
+        # Never block fan-out on a slow consumer: drop its backlog and let
+        # the sender resync it from a full snapshot instead
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+
+    def take_overflow(self) -> bool:
+        overflowed, self.overflowed = self.overflowed, False
+        return overflowed
+
+
+class GraphEventHub:
+    """
+    Per-worker fan-out: one Redis pub/sub connection, subscribed to the
+    systems that have local WebSocket listeners.
+    """
+
+    def __init__(self, max_queued: int = GRAPH_EVENT_QUEUE_SIZE):
+        self.max_queued = max_queued
+        self.subscribers = defaultdict(set)
+        self.client = None
+        self.pubsub = None
+        self._task = None
+        self.dropped_backlogs = 0
+
+    async def start(self):
+        if self._task:
+            return
+        self.client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.pubsub = self.client.pubsub()
+        self._task = asyncio.create_task(self._reader())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.pubsub:
+            await self.pubsub.aclose()
+        if self.client:
+            await self.client.aclose()
+
+    async def subscribe(self, system: str) -> Subscription:
+        subscription = Subscription(system, self.max_queued)
+        if not self.subscribers[system]:
+            await self.pubsub.subscribe(channel_name(system))
+        self.subscribers[system].add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription):
+        listeners = self.subscribers.get(subscription.system)
+        if listeners is None:
+            return
+        listeners.discard(subscription)
+        if not listeners:
+            del self.subscribers[subscription.system]
+            await self.pubsub.unsubscribe(channel_name(subscription.system))
+
+    async def _reader(self):
+        while True:
+            if not self.subscribers:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                print(f"⚠️ Graph event reader error: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not message or message["type"] != "message":
+                continue
+
+            event = json.loads(message["data"])
+            for subscription in list(self.subscribers.get(event["system"], ())):
+                if subscription.queue.full():
+                    self.dropped_backlogs += 1
+                subscription.offer(event)
+
+    def get_stats(self) -> dict:
+        return {
+            "systems": len(self.subscribers),
+            "subscribers": sum(len(s) for s in self.subscribers.values()),
+            "dropped_backlogs": self.dropped_backlogs
+        }
+
+
+# Global instance
+graph_event_hub = GraphEventHub()
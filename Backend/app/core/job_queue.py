@@ -0,0 +1,464 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import deque
+
+from app.core.cache import redis_client
+from app.core.config import JOB_QUEUE_BACKEND, JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_LEASE_SECONDS
+
+JOB_TTL = 86400  # Keep finished jobs around for a day
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+# Move members of a sorted set whose score (a due time) has passed onto the
+# queue, atomically, so a crash between the two steps can't lose a job.
+# Used for delayed retries and for reclaiming jobs whose lease expired.
+MOVE_DUE_LUA = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], id)
+    redis.call('LPUSH', KEYS[2], id)
+end
+return ids
+"""
+
+
+# Take the next job and lease it in the same step, so a worker that crashes
+# (or is cancelled) right after the pop leaves a lease to reclaim, not a lost id
+POP_AND_LEASE_LUA = """
+local id = redis.call('RPOP', KEYS[1])
+if id then
+    redis.call('ZADD', KEYS[2], ARGV[1], id)
+end
+return id
+"""
+
+
+def make_dedup_key(kind: str, params: dict) -> str:
+    raw = json.dumps({"kind": kind, "params": params}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class InMemoryJobBackend:
+    """Process-local job storage, used in tests and single-worker setups"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.queue = deque()
+        self.dedup = {}
+        self.delayed = {}  # job_id -> due time
+        self.leases = {}  # job_id -> lease deadline
+        self._available = asyncio.Event()
+
+    async def save(self, job: dict):
+        self.jobs[job["id"]] = dict(job)
+
+    async def load(self, job_id: str) -> dict | None:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def push(self, job_id: str):
+        self.queue.append(job_id)
+        self._available.set()
+
+    async def pop(self, timeout: float, lease_until: float) -> str | None:
+        if not self.queue:
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if not self.queue:
+            return None
+        job_id = self.queue.popleft()
+        self.leases[job_id] = lease_until
+        return job_id
+
+    async def schedule(self, job_id: str, due_at: float):
+        self.delayed[job_id] = due_at
+
+    async def promote_due(self, now: float) -> list:
+        return self._move_due(self.delayed, now)
+
+    async def lease(self, job_id: str, until: float):
+        self.leases[job_id] = until
+
+    async def release_lease(self, job_id: str):
+        self.leases.pop(job_id, None)
+
+    async def reclaim_expired(self, now: float) -> list:
+        return self._move_due(self.leases, now)
+
+    def _move_due(self, entries: dict, now: float) -> list:
+        due = [job_id for job_id, at in entries.items() if at <= now]
+        for job_id in due:
+            del entries[job_id]
+            self.queue.append(job_id)
+        if due:
+            self._available.set()
+        return due
+
+    async def claim_dedup(self, key: str, job_id: str) -> str:
+        return self.dedup.setdefault(key, job_id)
+
+    async def release_dedup(self, key: str):
+        self.dedup.pop(key, None)
+
+    async def depth(self) -> int:
+        return len(self.queue)
+
+    async def delayed_count(self) -> int:
+        return len(self.delayed)
+
+
+class RedisJobBackend:
+    """Shared job storage so any API worker can submit, run or poll a job"""
+
+    QUEUE_KEY = "jobs:queue"
+    DELAYED_KEY = "jobs:delayed"  # Retries waiting for their backoff, scored by due time
+    LEASES_KEY = "jobs:leases"  # Running jobs, scored by lease deadline
+
+    def __init__(self, client=redis_client, batch: int = 100):
+        self.client = client
+        self.batch = batch
+        self._move_due = client.register_script(MOVE_DUE_LUA)
+        self._pop_and_lease = client.register_script(POP_AND_LEASE_LUA)
+
+    async def save(self, job: dict):
+        self.client.setex(f"job:{job['id']}", JOB_TTL, json.dumps(job))
+
+    async def load(self, job_id: str) -> dict | None:
+        value = self.client.get(f"job:{job_id}")
+        return json.loads(value) if value else None
+
+    async def push(self, job_id: str):
+        self.client.lpush(self.QUEUE_KEY, job_id)
+
+    async def pop(self, timeout: float, lease_until: float) -> str | None:
+        # Polled rather than BRPOP: a blocking pop can't lease atomically, and
+        # a cancelled worker's thread would drop whatever it popped
+        job_id = self._pop_and_lease(keys=[self.QUEUE_KEY, self.LEASES_KEY], args=[lease_until])
+        if job_id is None:
+            await asyncio.sleep(timeout)
+        return job_id
+
+    async def schedule(self, job_id: str, due_at: float):
+        self.client.zadd(self.DELAYED_KEY, {job_id: due_at})
+
+    async def promote_due(self, now: float) -> list:
+        return self._move_due(keys=[self.DELAYED_KEY, self.QUEUE_KEY], args=[now, self.batch])
+
+    async def lease(self, job_id: str, until: float):
+        self.client.zadd(self.LEASES_KEY, {job_id: until})
+
+    async def release_lease(self, job_id: str):
+        self.client.zrem(self.LEASES_KEY, job_id)
+
+    async def reclaim_expired(self, now: float) -> list:
+        return self._move_due(keys=[self.LEASES_KEY, self.QUEUE_KEY], args=[now, self.batch])
+
+    async def claim_dedup(self, key: str, job_id: str) -> str:
+        dedup_key = f"jobs:dedup:{key}"
+        if self.client.set(dedup_key, job_id, nx=True, ex=JOB_TTL):
+            return job_id
+        return self.client.get(dedup_key) or job_id
+
+    async def release_dedup(self, key: str):
+        self.client.delete(f"jobs:dedup:{key}")
+
+    async def depth(self) -> int:
+        return self.client.llen(self.QUEUE_KEY)
+
+    async def delayed_count(self) -> int:
+        return self.client.zcard(self.DELAYED_KEY)
+
+
+class JobQueue:
+    """
+    Submit/poll/subscribe job runner for slow graph generation work.
+
+    A job is leased in the same step that takes it off the queue, and its
+    worker renews the lease every third of `lease_seconds` while it runs. If
+    the worker dies, the lease expires and any worker puts the job back on
+    the queue (counting it as an attempt). Retries wait
+    out their backoff in the backend's delayed set rather than in a sleeping
+    task, so they survive a restart.
+    """
+
+    def __init__(
+        self,
+        backend,
+        workers: int = 2,
+        max_attempts: int = 3,
+        retry_backoff: float = 1.0,
+        poll_interval: float = 0.5,
+        lease_seconds: float = 60
+    ):
+        self.backend = backend
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+
+        self.handlers = {}
+        self._tasks = []
+        self._events = {}
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.reclaimed = 0
+        self.wait_count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def register(self, kind: str, handler):
+        """Register an async handler called with the job's params as kwargs"""
+        self.handlers[kind] = handler
+
+    # -------------------------
+    # Client API
+    # -------------------------
+    async def submit(self, kind: str, params: dict) -> tuple[dict, bool]:
+        """
+        Enqueue a job, or return the identical job already pending/running.
+
+        Returns:
+            (job, deduplicated)
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        dedup_key = make_dedup_key(kind, params)
+        job_id = str(uuid.uuid4())
+
+        for _ in range(2):
+            owner = await self.backend.claim_dedup(dedup_key, job_id)
+            if owner == job_id:
+                break
+            existing = await self.backend.load(owner)
+            if existing and existing["status"] not in TERMINAL_STATUSES:
+                self.deduplicated += 1
+                return existing, True
+            # Stale claim left by an expired or finished job
+            await self.backend.release_dedup(dedup_key)
+
+        now = time.time()
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "params": params,
+            "status": "pending",
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "dedup_key": dedup_key,
+            "created_at": now,
+            "enqueued_at": now,
+            "started_at": None,
+            "finished_at": None
+        }
+        await self.backend.save(job)
+        await self.backend.push(job_id)
+        self.submitted += 1
+        return job, False
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self.backend.load(job_id)
+
+    async def watch(self, job_id: str, timeout: float):
+        """Yield the job every time its status changes, until it finishes or times out"""
+        deadline = time.monotonic() + timeout
+        last_status = None
+
+        while True:
+            job = await self.backend.load(job_id)
+            if job is None:
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield job
+            if job["status"] in TERMINAL_STATUSES:
+                self._events.pop(job_id, None)
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            # Local workers wake us immediately; remote ones are picked up by polling
+            event = self._events.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(self.poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+
+    async def wait(self, job_id: str, timeout: float) -> dict | None:
+        """Long-poll: return the job once finished, or its latest state on timeout"""
+        job = None
+        async for job in self.watch(job_id, timeout):
+            pass
+        return await self.backend.load(job_id) if job else None
+
+    # -------------------------
+    # Workers
+    # -------------------------
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            try:
+                await self._requeue_due()
+                job_id = await self.backend.pop(
+                    timeout=self.poll_interval,
+                    lease_until=time.time() + self.lease_seconds
+                )
+                if job_id is None:
+                    continue
+                await self.run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Backend hiccup (e.g. Redis restart): keep the worker alive
+                print(f"⚠️ Job worker error: {e}")
+                await asyncio.sleep(1)
+
+    async def _requeue_due(self):
+        """Queue retries whose backoff is over and jobs whose worker died"""
+        now = time.time()
+        await self.backend.promote_due(now)
+        for job_id in await self.backend.reclaim_expired(now):
+            self.reclaimed += 1
+            print(f"♻️ Job {job_id} lost its worker, requeued")
+
+    async def run_job(self, job_id: str):
+        job = await self.backend.load(job_id)
+        if not job or job["status"] in TERMINAL_STATUSES:
+            await self.backend.release_lease(job_id)
+            return
+
+        # Only a reclaimed job comes off the queue still marked running
+        if job["status"] == "running" and job["attempts"] >= self.max_attempts:
+            await self.backend.release_lease(job_id)
+            job["status"] = "failed"
+            job["error"] = "Worker stopped while running the job"
+            self.failed += 1
+            await self._finish(job)
+            return
+
+        job["status"] = "running"
+        job["attempts"] += 1
+        job["started_at"] = time.time()
+        self._record_wait(job["started_at"] - job["enqueued_at"])
+        await self.backend.lease(job_id, time.time() + self.lease_seconds)
+        await self._save(job)
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            job["result"] = await self.handlers[job["kind"]](**job["params"])
+        except asyncio.CancelledError:
+            # Shutting down mid-job: the lease expires and another worker
+            # picks the job up again
+            heartbeat.cancel()
+            raise
+        except Exception as e:
+            await self._end_lease(job_id, heartbeat)
+            job["error"] = str(e)
+            if job["attempts"] < self.max_attempts:
+                delay = self.retry_backoff * 2 ** (job["attempts"] - 1)
+                job["status"] = "pending"
+                job["enqueued_at"] = time.time() + delay
+                await self._save(job)
+                await self.backend.schedule(job_id, job["enqueued_at"])
+                self.retried += 1
+                return
+            job["status"] = "failed"
+            self.failed += 1
+        else:
+            await self._end_lease(job_id, heartbeat)
+            job["status"] = "succeeded"
+            job["error"] = None
+            self.succeeded += 1
+
+        await self._finish(job)
+
+    async def _heartbeat(self, job_id: str):
+        """Keep the lease alive while the handler runs"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.backend.lease(job_id, time.time() + self.lease_seconds)
+
+    async def _end_lease(self, job_id: str, heartbeat: asyncio.Task):
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        await self.backend.release_lease(job_id)
+
+    async def _finish(self, job: dict):
+        job["finished_at"] = time.time()
+        await self._save(job)
+        await self.backend.release_dedup(job["dedup_key"])
+
+    async def _save(self, job: dict):
+        await self.backend.save(job)
+        event = self._events.get(job["id"])
+        if event:
+            event.set()
+        if job["status"] in TERMINAL_STATUSES:
+            self._events.pop(job["id"], None)
+
+    def _record_wait(self, wait: float):
+        wait = max(wait, 0.0)
+        self.wait_count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    # -------------------------
+    # Metrics
+    # -------------------------
+    async def get_stats(self) -> dict:
+        avg_wait = self.total_wait / self.wait_count if self.wait_count else 0.0
+        return {
+            "queue_depth": await self.backend.depth(),
+            "delayed_retries": await self.backend.delayed_count(),
+            "workers": len(self._tasks),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "reclaimed": self.reclaimed,
+            "avg_wait_ms": round(avg_wait * 1000, 2),
+            "max_wait_ms": round(self.max_wait * 1000, 2)
+        }
+
+
+def _make_backend():
+    if JOB_QUEUE_BACKEND == "memory":
+        return InMemoryJobBackend()
+    return RedisJobBackend()
+
+
+# Global instance
+job_queue = JobQueue(
+    backend=_make_backend(),
+    workers=JOB_WORKERS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    lease_seconds=JOB_LEASE_SECONDS
+)
@@ -0,0 +1,59 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from app.core.cache import redis_client
+
+# Delete the lock only if we still own it (it may have expired and been
+# taken by someone else in the meantime)
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release = redis_client.register_script(RELEASE_LUA)
+
+
+class LockTimeout(RuntimeError):
+    def __init__(self, name: str):
+        super().__init__(f"Timed out waiting for lock {name}")
+        self.name = name
+
+
+def try_lock(name: str, ttl: float) -> str | None:
+    """Take a cluster-wide lock without waiting; returns its token, or None if held"""
+    token = str(uuid.uuid4())
+    if redis_client.set(f"lock:{name}", token, nx=True, px=int(ttl * 1000)):
+        return token
+    return None
+
+
+def unlock(name: str, token: str):
+    _release(keys=[f"lock:{name}"], args=[token])
+
+
+@asynccontextmanager
+async def redis_lock(names: list, ttl: float = 30, wait: float = 10, poll: float = 0.05):
+    """
+    Hold cluster-wide locks on `names` for the duration of the block.
+
+    Locks are taken in sorted order so two holders of overlapping sets can't
+    deadlock. Each expires after `ttl` seconds in case its holder dies.
+    Raises LockTimeout if they can't all be taken within `wait` seconds.
+    """
+    deadline = time.monotonic() + wait
+    held = []
+    try:
+        for name in sorted(set(names)):
+            while (token := try_lock(name, ttl)) is None:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(name)
+                await asyncio.sleep(poll)
+            held.append((name, token))
+        yield
+    finally:
+        for name, token in reversed(held):
+            unlock(name, token)
@@ -1,22 +1,272 @@
+import math
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from fastapi import Request, HTTPException
+from fastapi import Request
 from fastapi.responses import JSONResponse
 
-# Initialize rate limiter
+from app.core.cache import redis_client
+from app.core.config import (
+    REDIS_URL,
+    LLM_CALL_WEIGHT,
+    RATE_LIMIT_WINDOW_SECONDS,
+    LLM_MAX_IN_FLIGHT,
+)
+
+# Initialize rate limiter (Redis storage so limits are shared by all workers)
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["100/hour"]  # Global default
+    default_limits=["100/hour"],  # Global default
+    storage_uri=REDIS_URL
 )
 
+def _window_reset_seconds(request: Request, exc: RateLimitExceeded) -> int:
+    """Seconds until the window of the limit that was hit resets"""
+    current = getattr(request.state, "view_rate_limit", None)
+    try:
+        reset_at, _ = limiter.limiter.get_window_stats(current[0], *current[1])
+        return max(math.ceil(reset_at - time.time()), 1)
+    except Exception:
+        # Storage unreachable (or no stats): a full window is the safe answer
+        return exc.limit.limit.get_expiry()
+
+
 # Custom error handler for rate limit exceeded
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    retry_after = _window_reset_seconds(request, exc)
+    return JSONResponse(
+        status_code=429,
+        content={
+            "error": "Rate limit exceeded",
+            "message": f"Too many requests ({exc.detail}). Please try again later.",
+            "retry_after": retry_after
+        },
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+class WeightedRateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Rate limit exceeded")
+        self.retry_after = retry_after
+
+
+class LLMOverloadedError(RuntimeError):
+    """Too many LLM calls in flight; shed the request instead of queueing it"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("LLM capacity exhausted, please retry shortly")
+        self.retry_after = retry_after
+
+
+async def weighted_rate_limit_handler(request: Request, exc: WeightedRateLimitExceeded):
+    retry_after = max(math.ceil(exc.retry_after), 1)
     return JSONResponse(
         status_code=429,
         content={
             "error": "Rate limit exceeded",
             "message": "Too many requests. Please try again later.",
-            "retry_after": exc.detail
-        }
+            "retry_after": retry_after
+        },
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+async def retry_later_handler(request: Request, exc: Exception):
+    """503 for load shedding and open circuits; both carry retry_after"""
+    retry_after = max(math.ceil(getattr(exc, "retry_after", 1)), 1)
+    return JSONResponse(
+        status_code=503,
+        content={
+            "error": "Service busy",
+            "message": str(exc),
+            "retry_after": retry_after
+        },
+        headers={"Retry-After": str(retry_after)}
     )
+
+
+# -------------------------
+# Weighted sliding window
+# -------------------------
+
+# Sliding window counter: the previous fixed window's count is weighted by how
+# much of it still overlaps the sliding window. Returns {allowed, retry_after_ms}.
+SLIDING_WINDOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local limit = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local force = ARGV[4] == '1'
+
+local idx = math.floor(now / window)
+local elapsed = now - idx * window
+local curr_key = KEYS[1] .. ':' .. idx
+local prev_key = KEYS[1] .. ':' .. (idx - 1)
+local curr = tonumber(redis.call('GET', curr_key) or '0')
+local prev = tonumber(redis.call('GET', prev_key) or '0')
+local used = prev * (window - elapsed) / window + curr
+
+if not force and used + cost > limit then
+    local retry
+    if cost > limit then
+        retry = window
+    elseif curr + cost <= limit then
+        -- Enough of the previous window just has to slide out
+        retry = (used + cost - limit) * window / prev
+    else
+        -- Wait for this window to become the previous one and decay
+        retry = (window - elapsed) + math.max(0, window * (1 - (limit - cost) / curr))
+    end
+    return {0, math.ceil(retry)}
+end
+
+redis.call('INCRBY', curr_key, cost)
+redis.call('PEXPIRE', curr_key, window * 2)
+return {1, 0}
+"""
+
+_sliding_window = redis_client.register_script(SLIDING_WINDOW_LUA)
+
+# Per-request record of whether call_llm actually hit the provider
+_llm_usage: ContextVar[dict | None] = ContextVar("llm_usage", default=None)
+
+
+def note_llm_call():
+    """Called by the LLM client when a request reaches the provider"""
+    usage = _llm_usage.get()
+    if usage is not None:
+        usage["llm_calls"] += 1
+
+
+def track_llm_calls() -> dict:
+    """
+    Start counting LLM calls made by the current task (and tasks it starts).
+    Background work a request merely triggers (stale refreshes, speculation)
+    is started with a fresh context so it isn't counted.
+
+    Returns the {"llm_calls": n} dict note_llm_call updates.
+    """
+    usage = {"llm_calls": 0}
+    _llm_usage.set(usage)
+    return usage
+
+
+def charge_tokens(
+    request: Request,
+    scope: str,
+    tokens: int,
+    cost: int = 1,
+    force: bool = False,
+    window: int = RATE_LIMIT_WINDOW_SECONDS
+):
+    """
+    Charge `cost` tokens to the caller's budget for `scope`.
+
+    Raises WeightedRateLimitExceeded if they don't fit, unless `force` (used
+    to bill work that has already happened).
+    """
+    key = f"{{rl:{scope}:{get_remote_address(request)}}}"
+    allowed, retry_ms = _sliding_window(keys=[key], args=[tokens, cost, window * 1000, int(force)])
+    if not allowed:
+        raise WeightedRateLimitExceeded(retry_ms / 1000)
+
+
+def charge_llm_calls(request: Request, scope: str, tokens: int, usage: dict, window: int = RATE_LIMIT_WINDOW_SECONDS):
+    """Bill LLM_CALL_WEIGHT - 1 more tokens per call counted in `usage`"""
+    extra = usage["llm_calls"] * (LLM_CALL_WEIGHT - 1)
+    if extra > 0:
+        charge_tokens(request, scope, tokens, extra, force=True, window=window)
+
+
+def cost_aware_limit(scope: str, tokens: int, window: int = RATE_LIMIT_WINDOW_SECONDS):
+    """
+    FastAPI dependency enforcing a per-IP token budget shared across workers.
+
+    Admission costs 1 token. Once the endpoint has run, requests that
+    reached the LLM are charged LLM_CALL_WEIGHT - 1 more per call, so cache
+    hits are cheap and paid calls use up the budget quickly.
+    """
+    async def dependency(request: Request):
+        charge_tokens(request, scope, tokens, window=window)
+        usage = track_llm_calls()  # Scoped to this request's task
+        try:
+            yield
+        finally:
+            charge_llm_calls(request, scope, tokens, usage, window=window)
+
+    return dependency
+
+
+# -------------------------
+# LLM concurrency admission
+# -------------------------
+
+# Semaphore as a sorted set of leases, so a crashed worker can't leak slots
+ACQUIRE_SLOT_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[3]))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class ConcurrencyLimiter:
+    """Global cap on in-flight LLM calls, shared by all workers through Redis"""
+
+    KEY = "llm:in_flight"
+
+    def __init__(self, max_in_flight: int, lease_seconds: float = 90):
+        self.max_in_flight = max_in_flight
+        self.set_lease(lease_seconds)
+        self._acquire = redis_client.register_script(ACQUIRE_SLOT_LUA)
+        self.avg_call_seconds = 5.0  # EWMA, used as the Retry-After hint
+        self.shed = 0
+
+    def set_lease(self, seconds: float):
+        """
+        How long a slot survives without being released. Must outlast the
+        longest call, or the slot is reaped mid-call and the cap is exceeded.
+        """
+        self.lease_ms = int(seconds * 1000)
+
+    @contextmanager
+    def slot(self):
+        token = str(uuid.uuid4())
+        if not self._acquire(keys=[self.KEY], args=[token, self.max_in_flight, self.lease_ms]):
+            self.shed += 1
+            raise LLMOverloadedError(self.avg_call_seconds)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            redis_client.zrem(self.KEY, token)
+            duration = time.monotonic() - started
+            self.avg_call_seconds = 0.8 * self.avg_call_seconds + 0.2 * duration
+
+    def in_flight(self) -> int:
+        return redis_client.zcard(self.KEY)
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight(),
+            "max_in_flight": self.max_in_flight,
+            "shed_requests": self.shed,
+            "avg_call_s": round(self.avg_call_seconds, 2)
+        }
+
+
+# Global instance
+llm_concurrency = ConcurrencyLimiter(LLM_MAX_IN_FLIGHT)
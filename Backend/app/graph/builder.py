@@ -1,6 +1,8 @@
 from collections import deque, defaultdict
 from typing import Dict, List
 
+from app.graph.model import Node, Edge
+
 
 class GraphBuilder:
     def __init__(self, system_design: dict):
@@ -29,7 +31,8 @@ class GraphBuilder:
     # -------------------------
     # Public API
     # -------------------------
-    def build(self) -> Dict[str, List[dict]]:
+    def build(self) -> dict:
+        """{"system", "nodes": [Node], "edges": [Edge]}"""
         self._build_nodes()
         self._build_edges()
 
@@ -110,27 +113,21 @@ class GraphBuilder:
 
         return levels
 
-    def _build_ui_nodes(self, levels: Dict[str, int]) -> List[dict]:
+    def _build_ui_nodes(self, levels: Dict[str, int]) -> List[Node]:
         return [
-            {
-                "id": node_id,
-                "label": comp["name"],
-                "description": comp["description"],
-                "type": comp["type"],
-                "level": levels.get(node_id, 0),
-                "expandable": True
-            }
+            Node(
+                id=node_id,
+                label=comp["name"],
+                description=comp["description"],
+                type=comp["type"],
+                level=levels.get(node_id, 0)
+            )
             for node_id, comp in self.node_map.items()
         ]
 
-    def _build_ui_edges(self) -> List[dict]:
+    def _build_ui_edges(self) -> List[Edge]:
         return [
-            {
-                "id": f"{src}-{tgt}",
-                "source": src,
-                "target": tgt,
-                "relation": "depends_on"
-            }
+            Edge(src, tgt, "depends_on")
             for src, targets in self.adjacency.items()
             for tgt in targets
         ]
@@ -0,0 +1,136 @@
+import base64
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from typing import Dict, List
+
+from app.graph.model import Node, Edge, to_nodes, to_edges
+
+
+class GraphIndex:
+    """
+    Read-only lookup structures over one snapshot version.
+
+    Built once per (system, version) so neighborhood and filter queries don't
+    rescan the stored node/edge lists. Indexes are cached for many versions,
+    so nodes/edges are held as compact Node/Edge objects and only turned
+    back into dicts for the items a query returns.
+    """
+
+    def __init__(self, state: dict):
+        self.system = state["system"]
+        self.version = state["version"]
+        self.nodes: List[Node] = to_nodes(state.get("nodes", []))
+        self.edges: List[Edge] = to_edges(state.get("edges", []))
+
+        self.node_pos: Dict[str, int] = {n.id: i for i, n in enumerate(self.nodes)}
+        self.out_edges: Dict[str, List[int]] = defaultdict(list)
+        self.in_edges: Dict[str, List[int]] = defaultdict(list)
+        for i, edge in enumerate(self.edges):
+            self.out_edges[edge.source].append(i)
+            self.in_edges[edge.target].append(i)
+
+        # Node positions sorted by level, for level range scans
+        self.by_level = sorted(range(len(self.nodes)), key=lambda i: self.nodes[i].level)
+        self.level_keys = [self.nodes[i].level for i in self.by_level]
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    def neighborhood(self, node_id: str, k: int = 1, direction: str = "both") -> dict:
+        """Nodes within k hops of node_id, and the edges between them"""
+        if node_id not in self.node_pos:
+            raise KeyError(node_id)
+
+        hops = {node_id: 0}
+        queue = deque([node_id])
+        while queue:
+            current = queue.popleft()
+            if hops[current] == k:
+                continue
+            for neighbor in self._neighbors(current, direction):
+                if neighbor not in hops:
+                    hops[neighbor] = hops[current] + 1
+                    queue.append(neighbor)
+
+        positions = sorted(self.node_pos[i] for i in hops if i in self.node_pos)
+        edge_positions = sorted({
+            e
+            for i in hops
+            for e in self.out_edges.get(i, [])
+            if self.edges[e].target in hops
+        })
+        return {
+            "center": node_id,
+            "k": k,
+            "nodes": [self.nodes[i].to_dict() for i in positions],
+            "edges": [self.edges[e].to_dict() for e in edge_positions]
+        }
+
+    def node_positions(
+        self,
+        level_min: int | None = None,
+        level_max: int | None = None,
+        types: set | None = None
+    ) -> List[int]:
+        """Positions of nodes matching the filters, in stored order"""
+        if level_min is None and level_max is None:
+            candidates = range(len(self.nodes))
+        else:
+            lo = bisect_left(self.level_keys, level_min) if level_min is not None else 0
+            hi = bisect_right(self.level_keys, level_max) if level_max is not None else len(self.level_keys)
+            candidates = sorted(self.by_level[lo:hi])
+
+        if types:
+            return [i for i in candidates if self.nodes[i].type in types]
+        return list(candidates)
+
+    def page_nodes(self, cursor: str | None, limit: int, **filters) -> dict:
+        matching = self.node_positions(**filters)
+        return self._page([self.nodes[i] for i in matching], cursor, limit)
+
+    def page_edges(self, cursor: str | None, limit: int, **filters) -> dict:
+        if any(v is not None for v in filters.values()):
+            # Only edges whose endpoints both pass the node filters
+            allowed = {self.nodes[i].id for i in self.node_positions(**filters)}
+            edges = [e for e in self.edges if e.source in allowed and e.target in allowed]
+        else:
+            edges = self.edges
+        return self._page(edges, cursor, limit)
+
+    # -------------------------
+    # Internal Steps
+    # -------------------------
+    def _neighbors(self, node_id: str, direction: str):
+        if direction in ("out", "both"):
+            for e in self.out_edges.get(node_id, []):
+                yield self.edges[e].target
+        if direction in ("in", "both"):
+            for e in self.in_edges.get(node_id, []):
+                yield self.edges[e].source
+
+    def _page(self, items: list, cursor: str | None, limit: int) -> dict:
+        offset = self.decode_cursor(cursor) if cursor else 0
+        page = items[offset:offset + limit]
+        end = offset + len(page)
+        return {
+            "system": self.system,
+            "version": self.version,
+            "total": len(items),
+            "items": [item.to_dict() for item in page],
+            "next_cursor": self.encode_cursor(end) if end < len(items) else None
+        }
+
+    def encode_cursor(self, offset: int) -> str:
+        raw = f"{self.version}:{offset}".encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, cursor: str) -> int:
+        """Cursors are bound to the version they were issued for"""
+        try:
+            version, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+            version, offset = int(version), int(offset)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid cursor")
+        if version != self.version:
+            raise ValueError("Cursor belongs to a different graph version")
+        return max(offset, 0)
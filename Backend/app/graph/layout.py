@@ -0,0 +1,201 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+Positions = Dict[str, Tuple[float, float]]
+
+
+class GraphLayout:
+    """
+    Server-side node positioning, vectorized with NumPy.
+
+    - layered():        Sugiyama-style rows by node `level`, barycenter ordering
+    - force_directed(): Fruchterman-Reingold, optionally moving only some nodes
+    - incremental():    keep known positions, lay out only new nodes and their
+                        neighborhood
+    """
+
+    def __init__(
+        self,
+        nodes: List[dict],
+        edges: List[dict],
+        x_spacing: float = 220.0,
+        y_spacing: float = 160.0
+    ):
+        self.ids = [n["id"] for n in nodes]
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        self.levels = np.array([n.get("level", 0) for n in nodes], dtype=np.int64)
+        self.x_spacing = x_spacing
+        self.y_spacing = y_spacing
+
+        pairs = [
+            (self.index[e["source"]], self.index[e["target"]])
+            for e in edges
+            if e["source"] in self.index and e["target"] in self.index
+            and e["source"] != e["target"]
+        ]
+        edge_array = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        self.src = edge_array[:, 0]
+        self.tgt = edge_array[:, 1]
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    def layered(self, sweeps: int = 8) -> Positions:
+        n = len(self.ids)
+        if n == 0:
+            return {}
+
+        levels = self.levels - self.levels.min()
+        layer_sizes = np.bincount(levels)[levels]
+        rank = self._rank_within_layers(levels, np.arange(n, dtype=np.float64))
+
+        # Barycenter heuristic: reorder each layer by the mean x of neighbors
+        for _ in range(sweeps):
+            x = rank - (layer_sizes - 1) / 2.0
+            bary = self._neighbor_mean(x)
+            new_rank = self._rank_within_layers(levels, bary + rank * 1e-6)
+            if np.array_equal(new_rank, rank):
+                break
+            rank = new_rank
+
+        x = (rank - (layer_sizes - 1) / 2.0) * self.x_spacing
+        y = levels * self.y_spacing
+        return self._to_positions(np.column_stack([x, y]))
+
+    def force_directed(
+        self,
+        iterations: int = 150,
+        initial: Positions | None = None,
+        movable: Iterable[str] | None = None,
+        seed: int = 0
+    ) -> Positions:
+        n = len(self.ids)
+        if n == 0:
+            return {}
+
+        pos = self._initial_array(initial, seed)
+        if movable is None:
+            moving = np.arange(n)
+        else:
+            moving = np.array(sorted(self.index[i] for i in movable if i in self.index), dtype=np.int64)
+        if moving.size == 0:
+            return self._to_positions(pos)
+
+        # Ideal edge length k, and a temperature that cools linearly
+        k = self.x_spacing * 0.8
+        temperature = self.x_spacing
+        cooling = temperature / (iterations + 1)
+
+        for _ in range(iterations):
+            # Repulsion from every node onto each moving node: k^2 / d along
+            # the unit vector, i.e. delta * k^2 / d^2 (no sqrt needed)
+            delta = pos[moving][:, None, :] - pos[None, :, :]
+            dist_sq = np.einsum("ijk,ijk->ij", delta, delta)
+            np.maximum(dist_sq, 1e-6, out=dist_sq)
+            disp = np.einsum("ijk,ij->ik", delta, (k * k) / dist_sq)
+
+            # Attraction along edges: d^2 / k
+            if self.src.size:
+                edge_delta = pos[self.src] - pos[self.tgt]
+                edge_dist = np.maximum(np.sqrt((edge_delta ** 2).sum(axis=1)), 1e-3)
+                force = edge_delta * (edge_dist / k)[:, None]
+                full = np.zeros_like(pos)
+                np.add.at(full, self.src, -force)
+                np.add.at(full, self.tgt, force)
+                disp += full[moving]
+
+            length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-3)
+            step = np.minimum(length, temperature)
+            pos[moving] += disp / length[:, None] * step[:, None]
+            temperature = max(temperature - cooling, 1.0)
+
+        return self._to_positions(pos)
+
+    def incremental(
+        self,
+        previous: Positions,
+        changed: Iterable[str],
+        anchor: str | None = None,
+        iterations: int = 60
+    ) -> Positions:
+        """
+        Re-lay-out only the neighborhood of `changed` nodes.
+
+        Nodes already in `previous` keep their coordinates unless they are
+        direct neighbors of a changed node (the anchor always stays put).
+        New nodes start below the anchor, on their layered row. With nothing
+        changed (e.g. an expansion that only added edges) every known node
+        stays put, and only ids `previous` lacks get layered positions.
+        """
+        if not previous:
+            return self.layered()
+        changed = [c for c in changed if c in self.index]
+        if not changed:
+            known = {i: tuple(p) for i, p in previous.items() if i in self.index}
+            if len(known) < len(self.ids):
+                base = self.layered()
+                known.update({i: base[i] for i in self.ids if i not in known})
+            return {i: known[i] for i in self.ids}
+
+        changed_idx = np.array([self.index[c] for c in changed], dtype=np.int64)
+        is_changed = np.zeros(len(self.ids), dtype=bool)
+        is_changed[changed_idx] = True
+        touching = is_changed[self.src] | is_changed[self.tgt]
+        neighborhood = set(self.src[touching].tolist()) | set(self.tgt[touching].tolist())
+        neighborhood |= set(changed_idx.tolist())
+        if anchor in self.index:
+            neighborhood.discard(self.index[anchor])
+
+        # Seed new nodes in a row under the anchor so the simulation starts close
+        initial = {i: tuple(p) for i, p in previous.items() if i in self.index}
+        ax, ay = initial.get(anchor, (0.0, 0.0))
+        anchor_level = self.levels[self.index[anchor]] if anchor in self.index else 0
+        new_ids = [i for i in self.ids if i not in initial]
+        for j, node_id in enumerate(new_ids):
+            offset = (j - (len(new_ids) - 1) / 2.0) * self.x_spacing
+            rows_below = max(int(self.levels[self.index[node_id]] - anchor_level), 1)
+            initial[node_id] = (ax + offset, ay + rows_below * self.y_spacing)
+
+        movable = [self.ids[i] for i in neighborhood]
+        return self.force_directed(iterations=iterations, initial=initial, movable=movable)
+
+    # -------------------------
+    # Internal Steps
+    # -------------------------
+    def _neighbor_mean(self, x: np.ndarray) -> np.ndarray:
+        n = len(x)
+        if self.src.size == 0:
+            return x
+        total = (
+            np.bincount(self.tgt, weights=x[self.src], minlength=n)
+            + np.bincount(self.src, weights=x[self.tgt], minlength=n)
+        )
+        count = np.bincount(self.tgt, minlength=n) + np.bincount(self.src, minlength=n)
+        return np.where(count > 0, total / np.maximum(count, 1), x)
+
+    @staticmethod
+    def _rank_within_layers(levels: np.ndarray, key: np.ndarray) -> np.ndarray:
+        order = np.lexsort((key, levels))
+        sorted_levels = levels[order]
+        layer_start = np.searchsorted(sorted_levels, sorted_levels, side="left")
+        rank = np.empty(len(levels), dtype=np.float64)
+        rank[order] = np.arange(len(levels)) - layer_start
+        return rank
+
+    def _initial_array(self, initial: Positions | None, seed: int) -> np.ndarray:
+        base = self.layered()
+        rng = np.random.default_rng(seed)
+        pos = np.array([base[i] for i in self.ids], dtype=np.float64)
+        pos += rng.uniform(-1.0, 1.0, pos.shape)  # Break symmetry
+        for node_id, xy in (initial or {}).items():
+            if node_id in self.index:
+                pos[self.index[node_id]] = xy
+        return pos
+
+    def _to_positions(self, pos: np.ndarray) -> Positions:
+        return {
+            node_id: (round(float(x), 1), round(float(y), 1))
+            for node_id, (x, y) in zip(self.ids, pos)
+        }
@@ -0,0 +1,125 @@
+import sys
+from typing import Iterable, List
+
+
+def _intern(value) -> str:
+    return sys.intern(str(value))
+
+
+class Node:
+    """
+    Compact graph node used inside the graph pipeline.
+
+    ids and types are interned, so an id shared by a node and the edges
+    touching it (and repeated type names) are stored once. Keys a node was
+    loaded with that aren't modelled here are kept in `extra`.
+    """
+
+    __slots__ = ("id", "label", "description", "type", "level", "expandable", "extra")
+
+    def __init__(
+        self,
+        id: str,
+        label: str,
+        description: str = "",
+        type: str = "backend",
+        level: int = 0,
+        expandable: bool = True,
+        extra: dict | None = None
+    ):
+        self.id = _intern(id)
+        self.label = label
+        self.description = description
+        self.type = _intern(type)
+        self.level = level
+        self.expandable = expandable
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Node":
+        extra = {k: v for k, v in data.items() if k not in NODE_FIELDS}
+        return cls(
+            id=data["id"],
+            label=data.get("label", data["id"]),
+            description=data.get("description", ""),
+            type=data.get("type", "backend"),
+            level=data.get("level", 0),
+            expandable=data.get("expandable", True),
+            extra=extra
+        )
+
+    def to_dict(self) -> dict:
+        data = {
+            "id": self.id,
+            "label": self.label,
+            "description": self.description,
+            "type": self.type,
+            "level": self.level,
+            "expandable": self.expandable
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self) -> str:
+        return f"Node({self.id!r}, type={self.type!r}, level={self.level})"
+
+    def renamed(self, new_id: str) -> "Node":
+        return Node(new_id, self.label, self.description, self.type, self.level,
+                    self.expandable, dict(self.extra) if self.extra else None)
+
+
+class Edge:
+    """Compact directed edge; its id is always "<source>-<target>" """
+
+    __slots__ = ("source", "target", "relation")
+
+    def __init__(self, source: str, target: str, relation: str = "depends_on"):
+        self.source = _intern(source)
+        self.target = _intern(target)
+        self.relation = _intern(relation)
+
+    @property
+    def id(self) -> str:
+        return f"{self.source}-{self.target}"
+
+    @property
+    def key(self) -> tuple:
+        return (self.source, self.target)
+
+    def __repr__(self) -> str:
+        return f"Edge({self.source!r} -> {self.target!r}, {self.relation!r})"
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Edge":
+        return cls(data["source"], data["target"], data.get("relation", "depends_on"))
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "target": self.target,
+            "relation": self.relation
+        }
+
+
+NODE_FIELDS = frozenset(Node.__slots__) - {"extra"}
+
+
+def to_nodes(items: Iterable) -> List[Node]:
+    """Accept Node objects or node dicts"""
+    return [n if isinstance(n, Node) else Node.from_dict(n) for n in items]
+
+
+def to_edges(items: Iterable) -> List[Edge]:
+    """Accept Edge objects or edge dicts"""
+    return [e if isinstance(e, Edge) else Edge.from_dict(e) for e in items]
+
+
+def item_id(item) -> str:
+    return item["id"] if isinstance(item, dict) else item.id
+
+
+def to_dicts(items: Iterable) -> List[dict]:
+    """Node/Edge objects (or dicts, passed through) as plain dicts"""
+    return [i if isinstance(i, dict) else i.to_dict() for i in items]
@@ -1,17 +1,42 @@
-import httpx
+import asyncio
+import contextvars
 import json
 from app.core.config import get_groq_key
 import re
 from app.core.cache import (
-    get_cached_response,
+    get_cached_entry,
+    get_cached_responses,
     set_cached_response,
+    claim_refresh,
+    release_refresh,
+    get_negative_entry,
+    set_negative_entry,
 )
+from app.core.circuit_breaker import llm_breaker, CircuitOpenError
+from app.core.rate_limiter import llm_concurrency, note_llm_call, LLMOverloadedError
 from app.core.cost_monitor import cost_monitor
+from app.core.config import (
+    CACHE_REFRESH_MIN_HITS,
+    EXPAND_BATCH_MAX_NODES,
+    LLM_BACKENDS,
+    LLM_SLOT_LEASE_SLACK,
+)
+from app.llm.router import LLMBackend, LLMRouter, load_backends
 
 GROQ_API_KEY = get_groq_key()
 GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
 MODEL = "openai/gpt-oss-safeguard-20b"
 
+# Global instance; the primary backend (Groq unless LLM_BACKENDS is set) keeps
+# the `llm` circuit breaker reported in /metrics
+llm_router = LLMRouter(load_backends(
+    LLM_BACKENDS,
+    default=LLMBackend("groq", GROQ_URL, MODEL, GROQ_API_KEY, breaker=llm_breaker)
+))
+
+# A concurrency slot is held for the whole routed request, failover included
+llm_concurrency.set_lease(llm_router.max_request_seconds() + LLM_SLOT_LEASE_SLACK)
+
 SYSTEM_PROMPT = """
 You are a senior system architect.
 Return ONLY valid JSON.
@@ -25,8 +50,8 @@ def extract_json(text: str) -> dict:
     return json.loads(match.group())
 
 
-async def call_llm(system_name: str, use_cache: bool = True) -> dict:
-    prompt = f"""
+def build_prompt(system_name: str) -> str:
+    return f"""
 Decompose the system "{system_name}" into a high-level architecture.
 
 Required JSON Schema:
@@ -55,45 +80,251 @@ Rules:
 - Return ONLY the JSON object
 """
 
+
+def build_multi_expand_prompt(system_name: str, node_labels: list) -> str:
+    """One prompt asking for the subgraphs of several components of a system"""
+    labels = json.dumps(node_labels)
+    return f"""
+Decompose each of these components of the system "{system_name}" into its
+sub-components: {labels}
+
+Required JSON Schema:
+{{
+  "subgraphs": {{
+    "<component label, exactly as given>": {{
+      "system": "{system_name}::<component label>",
+      "components": [
+        {{
+          "name": "Component name",
+          "type": "frontend|backend|database|cache|gateway|queue|worker|storage",
+          "description": "Short description"
+        }}
+      ],
+      "edges": [
+        {{
+          "from": "Source component name",
+          "to": "Target component name",
+          "relation": "depends_on|calls|writes_to|reads_from"
+        }}
+      ]
+    }}
+  }}
+}}
+
+Rules:
+- One entry in "subgraphs" per component listed above
+- 3–6 sub-components per component
+- Architecture-level only
+- Return ONLY the JSON object
+"""
+
+
+def is_valid_design(design) -> bool:
+    """Shape check for a single system/subgraph design"""
+    if not isinstance(design, dict):
+        return False
+    components = design.get("components")
+    if not isinstance(components, list) or not components:
+        return False
+    if not all(isinstance(c, dict) and c.get("name") for c in components):
+        return False
+    return isinstance(design.get("edges", []), list)
+
+
+async def call_llm(system_name: str, use_cache: bool = True, speculative: bool = False) -> dict:
+    prompt = build_prompt(system_name)
+
     # Check cache FIRST
     if use_cache:
-        cached = get_cached_response(prompt)
-        if cached:
-            print("⚡ LLM CACHE HIT")
+        entry = get_cached_entry(prompt)
+        if entry:
+            cached, stale, hits = entry
+            if stale:
+                print("⚡ LLM CACHE HIT (stale)")
+                if hits >= CACHE_REFRESH_MIN_HITS:
+                    schedule_refresh(system_name, prompt)
+            else:
+                print("⚡ LLM CACHE HIT")
             return cached
 
     print("🔥 LLM CACHE MISS (or bypassed)")
-    
-    # Check budget before making expensive call
-    if not cost_monitor.check_budget_limit():
-        raise RuntimeError("Budget limit exceeded. Please contact administrator.")
+    return await _generate(
+        system_name,
+        prompt,
+        use_negative_cache=use_cache,
+        speculative=speculative
+    )
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": MODEL,
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0
-    }
-
-    # Call Groq
-    async with httpx.AsyncClient(timeout=60) as client:
-        response = await client.post(GROQ_URL, json=payload, headers=headers)
-        response.raise_for_status()
-
-    content = response.json()["choices"][0]["message"]["content"]
-    parsed = extract_json(content)
-    
-    # Record cost
-    cost_monitor.record_call(system_name)
+
+# Background refreshes in flight in this process, keyed by prompt
+_refresh_tasks = {}
+
+
+def schedule_refresh(system_name: str, prompt: str):
+    """Regenerate a stale entry in the background, once per prompt cluster-wide"""
+    if prompt in _refresh_tasks or not claim_refresh(prompt):
+        return
+    # Fresh context: the refresh must not count against the request that
+    # happened to trigger it (see rate_limiter.track_llm_calls)
+    task = asyncio.create_task(_refresh(system_name, prompt), context=contextvars.Context())
+    _refresh_tasks[prompt] = task
+    task.add_done_callback(lambda _: _refresh_tasks.pop(prompt, None))
+
+
+async def _refresh(system_name: str, prompt: str):
+    try:
+        await _generate(system_name, prompt)
+        print(f"♻️ LLM cache refreshed for {system_name}")
+    except Exception as e:
+        print(f"⚠️ Background refresh failed for {system_name}: {e}")
+    finally:
+        release_refresh(prompt)
+
+
+async def _generate(
+    system_name: str,
+    prompt: str,
+    use_negative_cache: bool = True,
+    speculative: bool = False
+) -> dict:
+    content = await _complete(system_name, prompt, use_negative_cache, speculative)
+    try:
+        parsed = extract_json(content)
+    except ValueError as e:
+        # Deterministic at temperature 0: remember it for a short while
+        set_negative_entry(prompt, str(e))
+        raise
     
     # Cache valid response
     set_cached_response(prompt, parsed)
     
     return parsed
+
+
+class BatchUnansweredError(RuntimeError):
+    """A node call_llm_multi(fallback=False) didn't get a valid subgraph for"""
+
+    def __init__(self, label: str):
+        super().__init__(f"No valid subgraph for {label} in the batch response")
+        self.label = label
+
+
+async def call_llm_multi(
+    system: str,
+    node_labels: list,
+    use_cache: bool = True,
+    speculative: bool = False,
+    fallback: bool = True
+) -> dict:
+    """
+    Expand several nodes of `system` with as few LLM calls as possible.
+
+    Cached nodes come from one pipelined lookup; the rest are requested in
+    chunks of EXPAND_BATCH_MAX_NODES per call. Each subgraph in a batched
+    response is validated on its own and cached under the same key as a
+    single `call_llm(f"{system}::{label}")`, so later single-node expansions
+    hit it. Nodes the batch didn't answer validly fall back to one call each
+    (concurrently); with `fallback=False` they are returned as a
+    BatchUnansweredError instead, for callers that pace their own calls.
+
+    Returns {label: design or the Exception that node failed with}.
+    """
+    labels = list(dict.fromkeys(node_labels))
+    prompts = {label: build_prompt(f"{system}::{label}") for label in labels}
+
+    results = {}
+    if use_cache:
+        cached = get_cached_responses([prompts[label] for label in labels])
+        for label, hit in zip(labels, cached):
+            if hit:
+                results[label] = hit
+        if results:
+            print(f"⚡ LLM CACHE HIT for {len(results)}/{len(labels)} nodes")
+
+    missing = [label for label in labels if label not in results]
+    retry = []
+    for i in range(0, len(missing), EXPAND_BATCH_MAX_NODES):
+        chunk = missing[i:i + EXPAND_BATCH_MAX_NODES]
+        if len(chunk) == 1:
+            retry.extend(chunk)  # A single node is cheaper with its own prompt
+            continue
+
+        print(f"🔥 LLM batch expansion of {len(chunk)} nodes")
+        batch_prompt = build_multi_expand_prompt(system, chunk)
+        try:
+            content = await _complete(
+                system,
+                batch_prompt,
+                use_negative_cache=use_cache,
+                speculative=speculative
+            )
+            subgraphs = extract_json(content).get("subgraphs")
+        except (CircuitOpenError, LLMOverloadedError):
+            raise
+        except Exception as e:
+            print(f"⚠️ Batch expansion failed, falling back to single calls: {e}")
+            if isinstance(e, ValueError):
+                set_negative_entry(batch_prompt, str(e))
+            subgraphs = None
+
+        if not isinstance(subgraphs, dict):
+            retry.extend(chunk)
+            continue
+        for label in chunk:
+            design = subgraphs.get(label)
+            if is_valid_design(design):
+                design["system"] = f"{system}::{label}"
+                set_cached_response(prompts[label], design)
+                results[label] = design
+            else:
+                retry.append(label)
+
+    if retry and not fallback:
+        results.update((label, BatchUnansweredError(label)) for label in retry)
+    elif retry:
+        designs = await asyncio.gather(
+            *(
+                _generate(f"{system}::{label}", prompts[label], use_cache, speculative)
+                for label in retry
+            ),
+            return_exceptions=True
+        )
+        results.update(zip(retry, designs))
+
+    return {label: results[label] for label in labels}
+
+
+async def _complete(
+    system_name: str,
+    prompt: str,
+    use_negative_cache: bool = True,
+    speculative: bool = False
+) -> str:
+    """One chat completion, behind the budget and admission checks"""
+    # Same prompt failed to parse moments ago; don't pay for it again
+    if use_negative_cache:
+        failure = get_negative_entry(prompt)
+        if failure:
+            raise ValueError(f"Recent identical request failed: {failure}")
+
+    # Check budget before making expensive call
+    if not cost_monitor.check_budget_limit():
+        raise RuntimeError("Budget limit exceeded. Please contact administrator.")
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+    # Shed load rather than queue behind the global in-flight cap. A hedged
+    # duplicate rides on the same slot: it only exists to cut tail latency.
+    with llm_concurrency.slot():
+        contacted = True
+        try:
+            return await llm_router.complete(messages, system_name, speculative=speculative)
+        except CircuitOpenError:
+            contacted = False  # Every backend fast-failed; nothing was sent
+            raise
+        finally:
+            if contacted:
+                note_llm_call()
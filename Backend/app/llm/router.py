@@ -0,0 +1,317 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+import httpx
+
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.core.cost_monitor import cost_monitor
+from app.core.config import (
+    BREAKER_WINDOW_SECONDS,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATE,
+    BREAKER_OPEN_SECONDS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_LATENCY_WINDOW,
+)
+
+
+class LatencyTracker:
+    """EWMA plus percentiles over the last `window` samples, in seconds"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW, alpha: float = 0.2):
+        self.samples = deque(maxlen=window)
+        self.alpha = alpha
+        self.ewma = None
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma = self.alpha * seconds + (1 - self.alpha) * self.ewma
+
+    def percentile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def get_stats(self) -> dict:
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            "samples": len(self.samples),
+            "ewma_s": rounded(self.ewma),
+            "p50_s": rounded(self.percentile(0.5)),
+            "p90_s": rounded(self.percentile(0.9)),
+            "p99_s": rounded(self.percentile(0.99))
+        }
+
+
+class LLMBackend:
+    """One OpenAI-compatible chat completions endpoint"""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        model: str,
+        api_key: str | None = None,
+        timeout: float = 60,
+        breaker: CircuitBreaker | None = None
+    ):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(
+            f"llm:{name}",
+            window_seconds=BREAKER_WINDOW_SECONDS,
+            min_calls=BREAKER_MIN_CALLS,
+            failure_rate=BREAKER_FAILURE_RATE,
+            open_seconds=BREAKER_OPEN_SECONDS
+        )
+        self.latency = LatencyTracker()
+
+    async def complete(self, messages: list, temperature: float = 0) -> dict:
+        """POST a chat completion; returns the response body"""
+        self.breaker.before_call()
+
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature
+        }
+
+        started = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.post(self.url, json=payload, headers=headers)
+                response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            # 4xx (other than 429) means a bad request, not a degraded provider
+            status = e.response.status_code
+            if status >= 500 or status == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (usually the losing half of a hedge): the elapsed time
+            # says nothing about this backend's latency, so it isn't recorded
+            self.breaker.release()
+            raise
+
+        self.latency.record(time.monotonic() - started)
+        self.breaker.record_success()
+        return response.json()
+
+    def get_stats(self) -> dict:
+        return {
+            "model": self.model,
+            "latency": self.latency.get_stats(),
+            "circuit": self.breaker.get_stats()
+        }
+
+
+def load_backends(spec: str, default: LLMBackend) -> list:
+    """
+    Parse LLM_BACKENDS (a JSON list); `default` is used when it is empty.
+    Otherwise the first entry takes over `default`'s circuit breaker, so a
+    breaker shared with the rest of the app tracks the primary backend.
+
+    Each entry: {"name", "url", "model", "api_key_env"?, "timeout"?}
+    """
+    if not spec.strip():
+        return [default]
+    return [
+        LLMBackend(
+            name=entry["name"],
+            url=entry["url"],
+            model=entry["model"],
+            api_key=os.getenv(entry["api_key_env"]) if entry.get("api_key_env") else None,
+            timeout=float(entry.get("timeout", 60)),
+            breaker=default.breaker if i == 0 else None
+        )
+        for i, entry in enumerate(json.loads(spec))
+    ]
+
+
+class LLMRouter:
+    """
+    Latency-aware routing with hedged requests.
+
+    The backend with the lowest latency EWMA gets the request. If it hasn't
+    answered by its own observed p90 (LLM_HEDGE_DEFAULT_DELAY until it has
+    LLM_HEDGE_MIN_SAMPLES samples), a duplicate goes to the next backend and
+    whichever answers first wins; the other is cancelled. A primary that
+    fails outright fails over to the next backend immediately.
+
+    Every completed or cancelled request is recorded in the cost monitor; the
+    losing half of a hedge is flagged `hedged` so its spend shows separately.
+    """
+
+    def __init__(
+        self,
+        backends: list,
+        monitor=cost_monitor,
+        hedge_enabled: bool = LLM_HEDGE_ENABLED,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        hedge_default_delay: float = LLM_HEDGE_DEFAULT_DELAY
+    ):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.monitor = monitor
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default_delay = hedge_default_delay
+
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def ranked(self) -> list:
+        """Backends whose circuit is not open, fastest EWMA first"""
+        available = [b for b in self.backends if not b.breaker.is_open()]
+        if not available:
+            retry_after = min(b.breaker.retry_after() for b in self.backends)
+            raise CircuitOpenError("llm", retry_after)
+        # Stable sort: backends without samples keep their configured order
+        return sorted(
+            available,
+            key=lambda b: b.latency.ewma if b.latency.ewma is not None else float("inf")
+        )
+
+    def max_request_seconds(self) -> float:
+        """
+        Longest a request can run: the primary's timeout plus a failover (or
+        hedge) to the backup, at worst the two slowest backends
+        """
+        timeouts = sorted((b.timeout for b in self.backends), reverse=True)
+        return sum(timeouts[:2])
+
+    def hedge_delay(self, backend: LLMBackend) -> float:
+        if len(backend.latency.samples) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return backend.latency.percentile(0.9)
+
+    async def complete(
+        self,
+        messages: list,
+        system_name: str,
+        speculative: bool = False
+    ) -> str:
+        """Message content of the first successful completion"""
+        candidates = self.ranked()
+        primary = candidates[0]
+        backup = candidates[1] if len(candidates) > 1 else None
+
+        tasks = {}  # task -> (backend, is_hedge)
+
+        def start(backend: LLMBackend, is_hedge: bool):
+            task = asyncio.create_task(backend.complete(messages))
+            tasks[task] = (backend, is_hedge)
+            return task
+
+        pending = {start(primary, False)}
+        hedged = False
+        winner = None
+        finished = []
+        last_error = None
+        try:
+            while pending:
+                timeout = None
+                if backup and len(tasks) == 1 and self.hedge_enabled:
+                    timeout = self.hedge_delay(primary)
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        # A fast-fail never hides a real error: callers rely on
+                        # CircuitOpenError meaning no backend was contacted
+                        if last_error is None or not isinstance(task.exception(), CircuitOpenError):
+                            last_error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        finished.append(task)
+                if winner:
+                    break
+
+                if backup and len(tasks) == 1:
+                    if not done:
+                        hedged = True
+                        self.hedges_sent += 1
+                        print(f"🐢 {primary.name} slower than p90, hedging to {backup.name}")
+                    else:
+                        self.failovers += 1
+                        print(f"↪️ {primary.name} failed, failing over to {backup.name}")
+                    pending.add(start(backup, True))
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is None:
+            raise last_error
+
+        backend, is_hedge = tasks[winner]
+        if hedged and is_hedge:
+            self.hedge_wins += 1
+        body = winner.result()
+        usage = body.get("usage")
+        self.monitor.record_call(
+            system_name,
+            model=backend.model,
+            usage=usage,
+            speculative=speculative
+        )
+
+        # The losing duplicate is hedging overhead, whether it finished or was
+        # cancelled (the provider has billed its prompt either way)
+        for task in finished:
+            self.monitor.record_call(
+                system_name,
+                model=tasks[task][0].model,
+                usage=task.result().get("usage"),
+                speculative=speculative,
+                hedged=True
+            )
+        for task in pending:
+            prompt_only = {"prompt_tokens": usage.get("prompt_tokens", 0)} if usage else None
+            self.monitor.record_call(
+                system_name,
+                model=tasks[task][0].model,
+                usage=prompt_only,
+                speculative=speculative,
+                hedged=True
+            )
+
+        return body["choices"][0]["message"]["content"]
+
+    def get_stats(self) -> dict:
+        return {
+            "hedging": self.hedge_enabled,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "backends": {b.name: b.get_stats() for b in self.backends}
+        }
@@ -1,11 +1,26 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.design import router as design_router
 from app.core.db import engine, Base
 from app.models.graph_snapshot import GraphSnapshot
-from app.core.rate_limiter import limiter, rate_limit_handler
+from app.core.rate_limiter import (
+    limiter,
+    rate_limit_handler,
+    weighted_rate_limit_handler,
+    retry_later_handler,
+    WeightedRateLimitExceeded,
+    LLMOverloadedError
+)
+from app.core.circuit_breaker import CircuitOpenError
 from slowapi.errors import RateLimitExceeded
 from app.core.performance import PerformanceMiddleware
+from app.core.job_queue import job_queue
+from app.core.graph_events import graph_event_hub
+from app.services.design_service import DesignService
+from app.services.cache_warmer import cache_warmer
+from app.services.snapshot_retention import snapshot_pruner, check_layout
+from app.core.config import WARMUP_ENABLED, SNAPSHOT_RETENTION_ENABLED
 
 
 app = FastAPI(title="ArchViz AI")
@@ -13,6 +28,9 @@ app = FastAPI(title="ArchViz AI")
 # Register rate limiter
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
+app.add_exception_handler(WeightedRateLimitExceeded, weighted_rate_limit_handler)
+app.add_exception_handler(LLMOverloadedError, retry_later_handler)
+app.add_exception_handler(CircuitOpenError, retry_later_handler)
 app.add_middleware(PerformanceMiddleware)
 
 # Configure CORS
@@ -28,6 +46,37 @@ app.add_middleware(
 @app.on_event("startup")
 def startup():
     Base.metadata.create_all(bind=engine)  # ← CREATE TABLES
+    check_layout()  # Monthly partitions for graph_snapshots
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_queue.register("build_graph", DesignService.build_graph)
+    job_queue.register("expand_node", DesignService.expand_node)
+    job_queue.start()
+
+@app.on_event("startup")
+async def schedule_cache_warmup():
+    if WARMUP_ENABLED:
+        app.state.warmup_task = asyncio.create_task(cache_warmer.run_scheduled())
+
+@app.on_event("startup")
+async def schedule_snapshot_maintenance():
+    # Partitions are always rolled forward; pruning is opt-in
+    app.state.prune_task = asyncio.create_task(
+        snapshot_pruner.run_scheduled(prune=SNAPSHOT_RETENTION_ENABLED)
+    )
+
+@app.on_event("startup")
+async def start_graph_event_hub():
+    await graph_event_hub.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+async def stop_graph_event_hub():
+    await graph_event_hub.stop()
 
 @app.get("/ping")
 def ping():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 import uuid
@@ -10,7 +10,15 @@ class GraphSnapshot(Base):
     __tablename__ = "graph_snapshots"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    system = Column(String, index=True)
+    system = Column(String)
     version = Column(Integer)
     state = Column(JSONB)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Partition key (monthly ranges, see snapshot_retention), so it is part
+    # of the primary key
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves every lookup (latest, by version, max per system)
+        Index("ix_graph_snapshots_system_version", "system", "version"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
@@ -5,6 +5,13 @@ from typing import List
 class BuildGraphRequest(BaseModel):
     system_name: str
     use_cache: bool = True
+    speculate: bool = False
+
+
+class BatchBuildGraphRequest(BaseModel):
+    system_names: List[str]
+    use_cache: bool = True
+    max_concurrency: int | None = None
 
 
 class GraphNode(BaseModel):
@@ -14,6 +21,8 @@ class GraphNode(BaseModel):
     type: str
     level: int
     expandable: bool
+    x: float | None = None  # Server-side layout, when enabled
+    y: float | None = None
 
 
 class GraphEdge(BaseModel):
@@ -35,6 +44,17 @@ class ExpandNodeRequest(BaseModel):
     max_depth: int = 1
 
 
+class ExpandNodesItem(BaseModel):
+    node_id: str
+    node_label: str
+
+
+class ExpandNodesRequest(BaseModel):
+    system: str
+    nodes: List[ExpandNodesItem]
+    max_depth: int = 1
+
+
 class ExpandNodeResponse(BaseModel):
     parent_node: str
     nodes: List[GraphNode]
@@ -59,3 +79,9 @@ class GraphDiffResponse(BaseModel):
     added_nodes: List[GraphNode]
     added_edges: List[GraphEdge]
     metadata: GraphMetadata
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    deduplicated: bool
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from app.llm.client import call_llm, call_llm_multi, build_prompt, BatchUnansweredError
+from app.graph.builder import GraphBuilder
+from app.core.cache import get_warm_responses, get_top_systems
+from app.core.cost_monitor import cost_monitor
+from app.core.config import (
+    EXPAND_BATCH_MAX_NODES,
+    WARMUP_HOUR_UTC,
+    WARMUP_TOP_SYSTEMS,
+    WARMUP_SEED_FILE,
+    WARMUP_EXPAND_NODES,
+    WARMUP_CALLS_PER_MINUTE,
+    WARMUP_MAX_COST,
+)
+
+
+def load_seed_file(path: str) -> list:
+    """One system name per line; blank lines and '#' comments are ignored"""
+    lines = Path(path).read_text(encoding="utf-8").splitlines()
+    return [
+        line.strip()
+        for line in lines
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+
+RUN_INTERVAL = 86400  # run_scheduled warms once a day
+EXPIRY_SLACK = 3600  # Entries may expire this long before the next run reaches them
+
+
+class CacheWarmer:
+    """Pre-populate the llm: cache for popular systems (and their nodes)"""
+
+    def __init__(
+        self,
+        calls_per_minute: int = WARMUP_CALLS_PER_MINUTE,
+        max_cost: float = WARMUP_MAX_COST,
+        keep_warm_for: int = RUN_INTERVAL - EXPIRY_SLACK
+    ):
+        self.min_interval = 60.0 / max(calls_per_minute, 1)
+        self.max_cost = max_cost
+        # An entry only counts as warm if it is fresh and stays cached for
+        # this long, i.e. until (about) the next run; anything older is
+        # regenerated now rather than left to expire for most of a day
+        self.keep_warm_for = keep_warm_for
+        self._last_call = 0.0
+        self.last_report = None
+
+    def select_systems(self, limit: int, seed_file: str | None = None) -> list:
+        """Seed file entries first, then the most-requested systems"""
+        names = load_seed_file(seed_file) if seed_file else []
+        names += get_top_systems(limit)
+        return list(dict.fromkeys(names))[:limit]
+
+    async def warm(
+        self,
+        limit: int = WARMUP_TOP_SYSTEMS,
+        seed_file: str | None = WARMUP_SEED_FILE,
+        expand_nodes: bool = WARMUP_EXPAND_NODES
+    ) -> dict:
+        """
+        Warm cache entries for the selected systems.
+
+        Stops early once this run has spent `max_cost` or the global
+        CostMonitor budget is exhausted. Only the LLM calls made by this run
+        count towards `max_cost`, not concurrent user traffic.
+        """
+        started = time.time()
+        report = {
+            "systems": 0,
+            "warmed": 0,
+            "already_cached": 0,
+            "failed": 0,
+            "stopped_on_budget": False
+        }
+
+        names = self.select_systems(limit, seed_file)
+        report["systems"] = len(names)
+
+        with cost_monitor.track_spend() as spend:
+            for name in names:
+                design = await self._warm_one(name, report, spend)
+                if report["stopped_on_budget"]:
+                    break
+                if expand_nodes and design:
+                    try:
+                        nodes = GraphBuilder(design).build()["nodes"]
+                    except ValueError:
+                        continue
+                    await self._warm_nodes(name, [n.label for n in nodes], report, spend)
+                if report["stopped_on_budget"]:
+                    break
+
+        report["cost_usd"] = round(spend["usd"], 4)
+        report["duration_s"] = round(time.time() - started, 2)
+        self.last_report = report
+        return report
+
+    async def _warm_one(self, name: str, report: dict, spend: dict) -> dict | None:
+        cached = get_warm_responses([build_prompt(name)], self.keep_warm_for)[0]
+        if cached:
+            report["already_cached"] += 1
+            return cached
+
+        if not await self._admit(report, spend):
+            return None
+        return await self._warm_single(name, report)
+
+    async def _warm_nodes(self, system: str, labels: list, report: dict, spend: dict):
+        """
+        Warm a system's node expansions, several nodes per LLM call. Each
+        batch call, and each single-node retry of a node the batch didn't
+        answer, is admitted separately.
+        """
+        prompts = [build_prompt(f"{system}::{label}") for label in labels]
+        cached = get_warm_responses(prompts, self.keep_warm_for)
+        missing = [label for label, hit in zip(labels, cached) if not hit]
+        report["already_cached"] += len(labels) - len(missing)
+
+        for i in range(0, len(missing), EXPAND_BATCH_MAX_NODES):
+            chunk = missing[i:i + EXPAND_BATCH_MAX_NODES]
+            if not await self._admit(report, spend):
+                return
+            try:
+                designs = await call_llm_multi(system, chunk, use_cache=False, fallback=False)
+            except Exception as e:
+                print(f"⚠️ Warmup failed for {system} nodes: {e}")
+                report["failed"] += len(chunk)
+                continue
+
+            for label, design in designs.items():
+                if isinstance(design, BatchUnansweredError):
+                    if not await self._admit(report, spend):
+                        return
+                    await self._warm_single(f"{system}::{label}", report)
+                elif isinstance(design, BaseException):
+                    print(f"⚠️ Warmup failed for {system}::{label}: {design}")
+                    report["failed"] += 1
+                else:
+                    report["warmed"] += 1
+
+    async def _warm_single(self, name: str, report: dict) -> dict | None:
+        try:
+            design = await call_llm(name, use_cache=False)
+        except Exception as e:
+            print(f"⚠️ Warmup failed for {name}: {e}")
+            report["failed"] += 1
+            return None
+
+        report["warmed"] += 1
+        return design
+
+    async def _admit(self, report: dict, spend: dict) -> bool:
+        """Budget check plus self rate limit, before each LLM request"""
+        if spend["usd"] + cost_monitor.cost_per_call > self.max_cost or not cost_monitor.check_budget_limit():
+            report["stopped_on_budget"] = True
+            return False
+
+        # Self rate limit so warming never competes with user traffic
+        wait = self._last_call + self.min_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._last_call = time.monotonic()
+        return True
+
+    async def run_scheduled(self, hour_utc: int = WARMUP_HOUR_UTC):
+        """Warm once a day at the configured off-peak hour"""
+        while True:
+            now = datetime.now(timezone.utc)
+            next_run = now.replace(hour=hour_utc, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+
+            try:
+                report = await self.warm()
+                print(f"🔥 Cache warmup finished: {report}")
+            except Exception as e:
+                print(f"⚠️ Cache warmup run failed: {e}")
+
+
+# Global instance
+cache_warmer = CacheWarmer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate popular systems into the LLM cache")
+    parser.add_argument("--limit", type=int, default=WARMUP_TOP_SYSTEMS, help="Number of systems to warm")
+    parser.add_argument("--seed", default=WARMUP_SEED_FILE, help="File with one system name per line")
+    parser.add_argument("--expand", action="store_true", default=WARMUP_EXPAND_NODES, help="Also pre-expand top-level nodes")
+    parser.add_argument("--max-cost", type=float, default=WARMUP_MAX_COST, help="Spend cap for this run in USD")
+    parser.add_argument("--rate", type=int, default=WARMUP_CALLS_PER_MINUTE, help="Max LLM calls per minute")
+    args = parser.parse_args()
+
+    warmer = CacheWarmer(calls_per_minute=args.rate, max_cost=args.max_cost)
+    report = asyncio.run(warmer.warm(limit=args.limit, seed_file=args.seed, expand_nodes=args.expand))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
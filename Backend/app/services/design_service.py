@@ -1,15 +1,28 @@
-from app.llm.client import call_llm
+import asyncio
+from app.llm.client import call_llm, call_llm_multi, build_prompt
+from app.core.cache import get_cached_responses, record_system_request
+from app.core.config import BATCH_LLM_CONCURRENCY
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.rate_limiter import LLMOverloadedError
 from app.graph.builder import GraphBuilder
 from app.graph.merge import GraphMerger
+from app.graph.model import to_dicts
 from app.services.graph_state import build_canonical_state
 from app.services.snapshot_service import SnapshotService
 from app.services.graph_diff import GraphDiff
+from app.services.layout_service import LayoutService
+from app.services.speculation_service import speculator
 
 
 class DesignService:
 
     @staticmethod
-    async def build_graph(system_name: str, return_diff: bool = False, use_cache: bool = True) -> dict:
+    async def build_graph(
+        system_name: str,
+        return_diff: bool = False,
+        use_cache: bool = True,
+        speculate: bool = False
+    ) -> dict:
         """
         Build initial graph with optional diff mode.
         
@@ -17,40 +30,154 @@ class DesignService:
             system_name: Name of system to design
             return_diff: If True, return only changes from previous version
             use_cache: If False, bypass LLM cache
+            speculate: If True, pre-expand the likeliest next nodes in the background
         """
+        record_system_request(system_name)
+
         try:
             system_design = await call_llm(system_name, use_cache=use_cache)
+        except (CircuitOpenError, LLMOverloadedError):
+            raise
         except Exception:
             raise RuntimeError("LLM failed to generate architecture")
 
         builder = GraphBuilder(system_design)
         graph = builder.build()
 
-        state = build_canonical_state(
-            system=system_name,
-            nodes=graph["nodes"],
-            edges=graph["edges"],
-            last_action="build_graph"
-        )
-
-        # Load previous state if diff mode requested
-        if return_diff:
+        async with SnapshotService.version_lock([system_name]):
             prev_state = SnapshotService.load_latest(system_name)
-            if prev_state:
+
+            state = build_canonical_state(
+                system=system_name,
+                nodes=graph["nodes"],
+                edges=graph["edges"],
+                last_action="build_graph",
+                version=prev_state["version"] + 1 if prev_state else 1
+            )
+
+            # Compute diff against previous state if requested
+            if return_diff and prev_state:
                 diff = GraphDiff.compute_diff(prev_state, state)
                 state["added_nodes"] = diff["added_nodes"]
                 state["added_edges"] = diff["added_edges"]
                 # Keep full nodes/edges for storage, but client uses added_*
-        
-        # Save snapshot
-        SnapshotService.save_snapshot(
-            system=system_name,
-            version=state["version"],
-            state=state
-        )
+
+            # Save snapshot
+            SnapshotService.save_snapshot(
+                system=system_name,
+                version=state["version"],
+                state=state,
+                prev_state=prev_state
+            )
+
+        # NumPy layout work stays off the event loop
+        await asyncio.to_thread(LayoutService.attach, state)
+
+        # The rebuilt graph supersedes speculation on the old one, on any worker
+        if speculate:
+            speculator.schedule(state)
+        else:
+            speculator.cancel(system_name)
 
         return state
+
+    @staticmethod
+    async def build_graphs_batch(
+        system_names: list,
+        use_cache: bool = True,
+        max_concurrency: int = BATCH_LLM_CONCURRENCY
+    ):
+        """
+        Build graphs for many systems, yielding per-system results as they complete.
+
+        Cache lookups for the whole batch go out in one Redis pipeline; misses
+        are sent to the LLM with at most `max_concurrency` calls in flight
+        (call_llm still enforces the cost budget per call). Systems that
+        finish together get their versions and are persisted with one bulk
+        insert (under their version locks) before they are yielded, so an
+        "ok" item is always saved; if the insert fails they are yielded as
+        errors instead. A final summary item follows.
+        """
+        names = list(dict.fromkeys(system_names))  # dedupe, keep order
+        if use_cache:
+            cached = get_cached_responses([build_prompt(name) for name in names])
+        else:
+            cached = [None] * len(names)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(name: str, design: dict | None) -> dict:
+            from_cache = design is not None
+            try:
+                if design is None:
+                    async with semaphore:
+                        design = await call_llm(name, use_cache=False)
+                graph = GraphBuilder(design).build()
+            except Exception as e:
+                return {"system": name, "status": "error", "error": str(e)}
+
+            # The version is allocated when the state is saved
+            state = build_canonical_state(
+                system=name,
+                nodes=graph["nodes"],
+                edges=graph["edges"],
+                last_action="build_graph",
+                version=0
+            )
+            return {"system": name, "status": "ok", "cached": from_cache, "state": state}
+
+        tasks = [
+            asyncio.create_task(run(name, design))
+            for name, design in zip(names, cached)
+        ]
+        pending = set(tasks)
+        saved = 0
+        failed = 0
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                items = [task.result() for task in tasks if task in done]
+                ok = [item for item in items if item["status"] == "ok"]
+                try:
+                    if ok:
+                        await DesignService._save_batch_states([item["state"] for item in ok])
+                except Exception as e:
+                    print(f"⚠️ Failed to save batch snapshots: {e}")
+                    error = f"Failed to save snapshot: {e}"
+                    items = [
+                        {"system": item["system"], "status": "error", "error": error}
+                        if item["status"] == "ok" else item
+                        for item in items
+                    ]
+
+                for item in items:
+                    if item["status"] == "ok":
+                        saved += 1
+                    else:
+                        failed += 1
+                    yield item
+        finally:
+            # Client went away mid-stream: don't leave LLM calls running
+            for task in tasks:
+                task.cancel()
+
+        yield {
+            "status": "done",
+            "requested": len(names),
+            "saved": saved,
+            "failed": failed
+        }
     
+    @staticmethod
+    async def _save_batch_states(states: list):
+        """Give each state its system's next version and bulk insert them"""
+        systems = [state["system"] for state in states]
+        async with SnapshotService.version_lock(systems):
+            latest_versions = SnapshotService.latest_versions(systems)
+            for state in states:
+                state["version"] = latest_versions.get(state["system"], 0) + 1
+            SnapshotService.save_snapshots(states)
+
     @staticmethod
     async def expand_node(
         system: str,
@@ -66,41 +193,146 @@ class DesignService:
             subgraph_design = await call_llm(
                 system_name=f"{system}::{node_label}"
             )
+        except (CircuitOpenError, LLMOverloadedError):
+            raise
         except Exception:
             raise RuntimeError("LLM failed to expand node")
 
+        speculator.note_expansion(system, node_label)
+
         subgraph_design["system"] = system
         subgraph_design.setdefault("edges", [])
 
         builder = GraphBuilder(subgraph_design)
         graph = builder.build()
 
-        for node in graph["nodes"]:
-            node["level"] += 1
+        # Load, merge and save as one step, or a concurrent expansion merged
+        # into the same base would be lost
+        async with SnapshotService.version_lock([system]):
+            prev_state = SnapshotService.load_latest(system)
 
-        state = build_canonical_state(
-            system=system,
-            nodes=graph["nodes"],
-            edges=graph["edges"],
-            last_action="expand_node",
-            parent_node=node_id
-        )
+            # Sub-components sit one level below the node they expand
+            parent_level = 0
+            if prev_state:
+                parent_level = next(
+                    (n["level"] for n in prev_state["nodes"] if n["id"] == node_id),
+                    0
+                )
+            for node in graph["nodes"]:
+                node.level += parent_level + 1
 
-        # Compute diff if requested
-        if return_diff:
-            prev_state = SnapshotService.load_latest(system)
+            # Merge into the existing graph so each snapshot is the full graph
             if prev_state:
+                graph = GraphMerger(prev_state).merge(node_id, graph)
+
+            state = build_canonical_state(
+                system=system,
+                nodes=graph["nodes"],
+                edges=graph["edges"],
+                last_action="expand_node",
+                parent_node=node_id,
+                version=prev_state["version"] + 1 if prev_state else 1
+            )
+
+            # Compute diff if requested
+            if return_diff and prev_state:
                 diff = GraphDiff.compute_diff(prev_state, state)
                 state["added_nodes"] = diff["added_nodes"]
                 state["added_edges"] = diff["added_edges"]
 
-        # Save snapshot
-        SnapshotService.save_snapshot(
-            system=system,
-            version=state["version"],
-            state=state
-        )
+            # Save snapshot
+            SnapshotService.save_snapshot(
+                system=system,
+                version=state["version"],
+                state=state,
+                prev_state=prev_state
+            )
+
+        await asyncio.to_thread(LayoutService.attach, state, prev_state)
+
+        return state
+
+    @staticmethod
+    async def expand_nodes(
+        system: str,
+        nodes: list,
+        max_depth: int = 1,
+        return_diff: bool = False
+    ) -> dict:
+        """
+        Expand several nodes at once into a single new version.
+
+        Uncached nodes share one LLM call (see call_llm_multi). A node whose
+        subgraph can't be generated or built is reported under `failed`
+        without failing the others.
+
+        Args:
+            nodes: [{"node_id": ..., "node_label": ...}]
+        """
+        labels = [n["node_label"] for n in nodes]
+        designs = await call_llm_multi(system, labels)
+
+        async with SnapshotService.version_lock([system]):
+            prev_state = SnapshotService.load_latest(system)
+            levels = {n["id"]: n["level"] for n in prev_state["nodes"]} if prev_state else {}
+            graph = prev_state or {"nodes": [], "edges": []}
+            merger = GraphMerger(graph)
+
+            expanded = []
+            failed = []
+            overloaded = None
+            for node in nodes:
+                node_id, label = node["node_id"], node["node_label"]
+                design = designs[label]
+                try:
+                    if isinstance(design, BaseException):
+                        raise design
+                    design = {**design, "system": system}
+                    design.setdefault("edges", [])
+                    subgraph = GraphBuilder(design).build()
+                except Exception as e:
+                    failed.append({"node_id": node_id, "error": str(e)})
+                    if isinstance(e, (CircuitOpenError, LLMOverloadedError)):
+                        overloaded = e
+                    continue
+
+                # Sub-components sit one level below the node they expand
+                for sub_node in subgraph["nodes"]:
+                    sub_node.level += levels.get(node_id, 0) + 1
+                graph = merger.merge(node_id, subgraph)
+                speculator.note_expansion(system, label)
+                expanded.append(node_id)
+
+            if not expanded:
+                if overloaded:
+                    raise overloaded
+                raise RuntimeError("LLM failed to expand nodes")
+
+            state = build_canonical_state(
+                system=system,
+                nodes=graph["nodes"],
+                edges=graph["edges"],
+                last_action="expand_nodes",
+                parent_node=expanded[0] if len(expanded) == 1 else None,
+                version=prev_state["version"] + 1 if prev_state else 1
+            )
+
+            if return_diff and prev_state:
+                diff = GraphDiff.compute_diff(prev_state, state)
+                state["added_nodes"] = diff["added_nodes"]
+                state["added_edges"] = diff["added_edges"]
+
+            SnapshotService.save_snapshot(
+                system=system,
+                version=state["version"],
+                state=state,
+                prev_state=prev_state
+            )
+
+        await asyncio.to_thread(LayoutService.attach, state, prev_state)
 
+        state["expanded"] = expanded
+        state["failed"] = failed
         return state
     
 
@@ -108,9 +340,10 @@ class DesignService:
     @staticmethod
     def merge_graph(base_graph: dict, subgraph: dict) -> dict:
         merger = GraphMerger(base_graph)
-        return merger.merge(
+        merged = merger.merge(
             parent_node=subgraph["parent_node"],
             subgraph=subgraph
         )
+        return {"nodes": to_dicts(merged["nodes"]), "edges": to_dicts(merged["edges"])}
 
       
\ No newline at end of file
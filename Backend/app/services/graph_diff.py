@@ -1,5 +1,7 @@
 from typing import List, Dict, Set
 
+from app.graph.model import item_id
+
 class GraphDiff:
     """Computes differences between two graph states"""
     
@@ -11,6 +13,9 @@ class GraphDiff:
         Args:
             old_state: Previous graph state with nodes/edges
             new_state: New graph state with nodes/edges
+
+        Nodes and edges may be dicts or Node/Edge objects; added items are
+        returned in whichever form `new_state` holds them.
             
         Returns:
             {
@@ -18,11 +23,11 @@ class GraphDiff:
                 "added_edges": [...]
             }
         """
-        old_node_ids = {node["id"] for node in old_state.get("nodes", [])}
-        new_node_ids = {node["id"] for node in new_state.get("nodes", [])}
+        old_node_ids = {item_id(node) for node in old_state.get("nodes", [])}
+        new_node_ids = {item_id(node) for node in new_state.get("nodes", [])}
         
-        old_edge_ids = {edge["id"] for edge in old_state.get("edges", [])}
-        new_edge_ids = {edge["id"] for edge in new_state.get("edges", [])}
+        old_edge_ids = {item_id(edge) for edge in old_state.get("edges", [])}
+        new_edge_ids = {item_id(edge) for edge in new_state.get("edges", [])}
         
         # Find additions
         added_node_ids = new_node_ids - old_node_ids
@@ -31,15 +36,24 @@ class GraphDiff:
         # Extract full node/edge objects
         added_nodes = [
             node for node in new_state["nodes"]
-            if node["id"] in added_node_ids
+            if item_id(node) in added_node_ids
         ]
         
         added_edges = [
             edge for edge in new_state["edges"]
-            if edge["id"] in added_edge_ids
+            if item_id(edge) in added_edge_ids
         ]
         
         return {
             "added_nodes": added_nodes,
             "added_edges": added_edges
         }
+
+    @staticmethod
+    def is_additive(old_state: dict, new_state: dict) -> bool:
+        """True if every node and edge of `old_state` is still in `new_state`"""
+        for kind in ("nodes", "edges"):
+            new_ids = {item_id(item) for item in new_state.get(kind, [])}
+            if any(item_id(item) not in new_ids for item in old_state.get(kind, [])):
+                return False
+        return True
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+from app.core.config import GRAPH_INDEX_CACHE_SIZE
+from app.graph.index import GraphIndex
+from app.services.snapshot_service import SnapshotService
+
+
+class GraphQueryService:
+    """Serve partial graph queries from a per-version index"""
+
+    # (system, version) -> GraphIndex, least recently used first
+    _indexes: "OrderedDict[tuple, GraphIndex]" = OrderedDict()
+
+    @staticmethod
+    def get_index(system: str, version: int | None = None) -> GraphIndex | None:
+        """
+        Index for a version (latest if None). Versions are immutable, so an
+        index is built once and reused until evicted.
+        """
+        if version is None:
+            version = SnapshotService.latest_versions([system]).get(system)
+            if version is None:
+                return None
+
+        key = (system, version)
+        cache = GraphQueryService._indexes
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        state = SnapshotService.load_version(system, version)
+        if state is None:
+            return None
+
+        index = GraphIndex(state)
+        cache[key] = index
+        if len(cache) > GRAPH_INDEX_CACHE_SIZE:
+            cache.popitem(last=False)
+        return index
+
+    @staticmethod
+    def get_stats() -> dict:
+        return {
+            "cached_indexes": len(GraphQueryService._indexes),
+            "capacity": GRAPH_INDEX_CACHE_SIZE
+        }
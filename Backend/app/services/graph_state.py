@@ -1,3 +1,6 @@
+from app.graph.model import to_dicts
+
+
 def build_canonical_state(
     system: str,
     nodes: list,
@@ -6,11 +9,15 @@ def build_canonical_state(
     parent_node: str | None = None,
     version: int = 1
 ) -> dict:
+    """
+    The persisted/API form of a graph: Node/Edge objects from the graph
+    pipeline become plain dicts here, and nowhere earlier.
+    """
     return {
         "system": system,
         "version": version,
-        "nodes": nodes,
-        "edges": edges,
+        "nodes": to_dicts(nodes),
+        "edges": to_dicts(edges),
         "metadata": {
             "last_action": last_action,
             "parent_node": parent_node
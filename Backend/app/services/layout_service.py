@@ -0,0 +1,67 @@
+import json
+
+from app.core.cache import redis_client
+from app.core.config import GRAPH_LAYOUT, LAYOUT_FORCE_MAX_NODES, LAYOUT_CACHE_TTL
+from app.graph.layout import GraphLayout
+
+
+class LayoutService:
+    """Node coordinates for a snapshot, cached in Redis per (system, version)"""
+
+    @staticmethod
+    def cache_key(system: str, version: int) -> str:
+        return f"layout:{system}:{version}"
+
+    @staticmethod
+    def get_cached(system: str, version: int) -> dict | None:
+        value = redis_client.get(LayoutService.cache_key(system, version))
+        return json.loads(value) if value else None
+
+    @staticmethod
+    def set_cached(system: str, version: int, positions: dict):
+        redis_client.setex(
+            LayoutService.cache_key(system, version),
+            LAYOUT_CACHE_TTL,
+            json.dumps(positions)
+        )
+
+    @staticmethod
+    def compute(state: dict, prev_state: dict | None = None) -> dict:
+        """
+        Lay out a canonical state.
+
+        When the previous version's layout is cached, only the new nodes and
+        their neighbors move; everything else keeps its coordinates.
+        """
+        layout = GraphLayout(state["nodes"], state["edges"])
+
+        if prev_state:
+            previous = LayoutService.get_cached(prev_state["system"], prev_state["version"])
+            if previous:
+                prev_ids = {n["id"] for n in prev_state["nodes"]}
+                changed = [n["id"] for n in state["nodes"] if n["id"] not in prev_ids]
+                return layout.incremental(
+                    previous,
+                    changed,
+                    anchor=state["metadata"].get("parent_node")
+                )
+
+        if GRAPH_LAYOUT == "force" and len(state["nodes"]) <= LAYOUT_FORCE_MAX_NODES:
+            return layout.force_directed()
+        return layout.layered()
+
+    @staticmethod
+    def attach(state: dict, prev_state: dict | None = None) -> dict:
+        """Add x/y to every node, computing and caching the layout on a miss"""
+        if GRAPH_LAYOUT == "none" or not state.get("nodes"):
+            return state
+
+        positions = LayoutService.get_cached(state["system"], state["version"])
+        if positions is None:
+            positions = LayoutService.compute(state, prev_state)
+            LayoutService.set_cached(state["system"], state["version"], positions)
+
+        for node in state["nodes"]:
+            if node["id"] in positions:
+                node["x"], node["y"] = positions[node["id"]]
+        return state
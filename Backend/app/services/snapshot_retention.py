@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.core.db import engine, Base
+from app.core.locks import try_lock, unlock
+from app.models.graph_snapshot import GraphSnapshot
+from app.core.config import (
+    SNAPSHOT_KEEP_VERSIONS,
+    SNAPSHOT_CHECKPOINT_DAYS,
+    SNAPSHOT_PRUNE_BATCH,
+    SNAPSHOT_PRUNE_INTERVAL,
+    SNAPSHOT_PARTITION_MONTHS_AHEAD,
+)
+
+TABLE = GraphSnapshot.__tablename__
+LEGACY_TABLE = f"{TABLE}_legacy"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_RE = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+# -------------------------
+# Partitions
+# -------------------------
+def partition_name(month: datetime) -> str:
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def month_starts(start: datetime, end: datetime) -> list:
+    """First day of every month from start's month through end's month"""
+    month = datetime(start.year, start.month, 1)
+    months = []
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def table_kind(conn, name: str) -> str | None:
+    """'p' for a partitioned table, 'r' for a plain one, None if missing"""
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND pg_table_is_visible(oid)"),
+        {"name": name}
+    ).scalar()
+
+
+def ensure_partitions(start: datetime | None = None, months_ahead: int = SNAPSHOT_PARTITION_MONTHS_AHEAD):
+    """
+    Create monthly partitions from `start` (default: this month) through
+    `months_ahead` months from now. Safe to call repeatedly.
+
+    There is deliberately no DEFAULT partition: Postgres refuses
+    DETACH PARTITION ... CONCURRENTLY while one exists, and old partitions
+    must be detached without locking the table. An empty one left by an
+    older layout is dropped here; inserts rely on partitions being rolled
+    forward by `run_scheduled` instead.
+    """
+    now = datetime.utcnow()
+    end = now + timedelta(days=31 * months_ahead)
+    with engine.begin() as conn:
+        if table_kind(conn, TABLE) != "p":
+            return
+        for month in month_starts(start or now, end):
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+            ))
+        if table_kind(conn, DEFAULT_PARTITION) == "r":
+            if conn.execute(text(f"SELECT 1 FROM {DEFAULT_PARTITION} LIMIT 1")).first() is None:
+                conn.execute(text(f"DROP TABLE {DEFAULT_PARTITION}"))
+            else:
+                print(
+                    f"⚠️ {DEFAULT_PARTITION} holds rows; old partitions can't be detached "
+                    "concurrently until they are moved into monthly partitions"
+                )
+
+
+def drop_empty_partitions(before: datetime) -> list:
+    """
+    Drop monthly partitions that ended before `before` and hold no rows.
+
+    Each is detached with DETACH PARTITION ... CONCURRENTLY first (which
+    can't run inside a transaction block, hence autocommit), so readers and
+    writers of the parent table are never blocked; the DROP then only locks
+    the detached table. A detach interrupted by a crash is finalized.
+    """
+    with engine.connect() as conn:
+        partitions = conn.execute(text(
+            "SELECT c.relname, i.inhdetachpending FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table"
+        ), {"table": TABLE}).all()
+        candidates = []
+        for name, detach_pending in partitions:
+            match = PARTITION_RE.match(name)
+            if not match:
+                continue
+            month = datetime(int(match.group(1)), int(match.group(2)), 1)
+            if next_month(month) > before:
+                continue
+            if conn.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is None:
+                candidates.append((name, detach_pending))
+
+    dropped = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, detach_pending in candidates:
+            mode = "FINALIZE" if detach_pending else "CONCURRENTLY"
+            try:
+                conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name} {mode}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+            except Exception as e:
+                print(f"⚠️ Could not drop partition {name}: {e}")
+                continue
+            dropped.append(name)
+    return dropped
+
+
+# -------------------------
+# Migration
+# -------------------------
+def migrate_legacy_table(batch_size: int = 1000, keep_legacy: bool = False) -> int:
+    """
+    Move rows from an unpartitioned graph_snapshots table into the
+    partitioned layout. Copies in keyset-ordered batches, one transaction
+    each, and can be re-run after an interruption. Returns rows copied.
+    """
+    with engine.begin() as conn:
+        if table_kind(conn, TABLE) == "r":
+            print(f"📦 Renaming {TABLE} to {LEGACY_TABLE}")
+            conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}"))
+            conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {LEGACY_TABLE}_pkey"))
+            conn.execute(text(f"ALTER INDEX IF EXISTS ix_{TABLE}_system RENAME TO ix_{LEGACY_TABLE}_system"))
+        if table_kind(conn, LEGACY_TABLE) is None:
+            print(f"✅ {TABLE} is already partitioned, nothing to migrate")
+            return 0
+        conn.execute(text(f"UPDATE {LEGACY_TABLE} SET created_at = now() WHERE created_at IS NULL"))
+        earliest = conn.execute(text(f"SELECT min(created_at) FROM {LEGACY_TABLE}")).scalar()
+
+    Base.metadata.create_all(bind=engine, tables=[GraphSnapshot.__table__])
+    ensure_partitions(start=earliest)
+
+    copied = 0
+    last = (datetime.min, "")
+    while True:
+        with engine.begin() as conn:
+            keys = conn.execute(text(
+                f"SELECT created_at, id FROM {LEGACY_TABLE} "
+                "WHERE (created_at, id) > (:created_at, :id) "
+                "ORDER BY created_at, id LIMIT :limit"
+            ), {"created_at": last[0], "id": last[1], "limit": batch_size}).all()
+            if not keys:
+                break
+            conn.execute(text(
+                f"INSERT INTO {TABLE} (id, system, version, state, created_at) "
+                f"SELECT id, system, version, state, created_at FROM {LEGACY_TABLE} "
+                "WHERE id = ANY(:ids) "
+                "ON CONFLICT (id, created_at) DO NOTHING"
+            ), {"ids": [k.id for k in keys]})
+        copied += len(keys)
+        last = (keys[-1].created_at, keys[-1].id)
+        print(f"  copied {copied} rows")
+
+    if not keep_legacy:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    print(f"✅ Migrated {copied} snapshots into partitioned {TABLE}")
+    return copied
+
+
+def check_layout():
+    """
+    Called at startup: partitions for new rows, or a hint to migrate.
+    Every worker calls it; the first to take the lock does the work.
+    """
+    token = try_lock("snapshot_layout", ttl=60)
+    if token is None:
+        return
+    try:
+        with engine.connect() as conn:
+            kind = table_kind(conn, TABLE)
+        if kind == "r":
+            print(
+                f"⚠️ {TABLE} is not partitioned; retention still works, but run "
+                "`python -m app.services.snapshot_retention migrate` to partition it"
+            )
+            return
+        ensure_partitions()
+    finally:
+        unlock("snapshot_layout", token)
+
+
+# -------------------------
+# Retention
+# -------------------------
+class SnapshotPruner:
+    """
+    Enforce the snapshot retention policy in small batches.
+
+    Per system, a snapshot is kept if it is one of the last `keep_versions`
+    versions, or the last snapshot of its UTC day within `checkpoint_days`.
+    Everything else is deleted `batch_size` rows per transaction, so no
+    DELETE holds locks for long. Old partitions left empty are dropped.
+    """
+
+    def __init__(
+        self,
+        keep_versions: int = SNAPSHOT_KEEP_VERSIONS,
+        checkpoint_days: int = SNAPSHOT_CHECKPOINT_DAYS,
+        batch_size: int = SNAPSHOT_PRUNE_BATCH,
+        pause_seconds: float = 0.05
+    ):
+        self.keep_versions = keep_versions
+        self.checkpoint_days = checkpoint_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.last_report = None
+
+    @staticmethod
+    def select_victims(rows: list, keep_versions: int, checkpoint_since: datetime) -> list:
+        """
+        Rows to delete for one system.
+
+        Args:
+            rows: (id, version, created_at) tuples
+            keep_versions: newest versions always kept
+            checkpoint_since: daily checkpoints are kept from this time on
+        """
+        ordered = sorted(rows, key=lambda r: (r[1], r[2]), reverse=True)
+        keep = {r[0] for r in ordered[:keep_versions]}
+
+        # Newest snapshot of each day is that day's checkpoint
+        seen_days = set()
+        for row_id, _, created_at in ordered:
+            day = created_at.date()
+            if day not in seen_days:
+                seen_days.add(day)
+                if created_at >= checkpoint_since:
+                    keep.add(row_id)
+
+        return [(r[0], r[2]) for r in ordered if r[0] not in keep]
+
+    def prune(self) -> dict:
+        started = time.time()
+        checkpoint_since = datetime.utcnow() - timedelta(days=self.checkpoint_days)
+        report = {"systems_checked": 0, "deleted": 0, "dropped_partitions": []}
+
+        # Only systems that have more rows than the policy could ever keep
+        with engine.connect() as conn:
+            systems = conn.execute(text(
+                f"SELECT system FROM {TABLE} GROUP BY system HAVING count(*) > :keep"
+            ), {"keep": self.keep_versions}).scalars().all()
+
+        for system in systems:
+            report["systems_checked"] += 1
+            report["deleted"] += self.prune_system(system, checkpoint_since)
+
+        # Keep-last-N rows can live in old partitions; only empty ones go
+        report["dropped_partitions"] = drop_empty_partitions(checkpoint_since)
+        report["duration_s"] = round(time.time() - started, 2)
+        self.last_report = report
+        return report
+
+    def prune_system(self, system: str, checkpoint_since: datetime) -> int:
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT id, version, created_at FROM {TABLE} WHERE system = :system"
+            ), {"system": system}).all()
+
+        victims = self.select_victims(
+            [tuple(r) for r in rows],
+            self.keep_versions,
+            checkpoint_since
+        )
+        for i in range(0, len(victims), self.batch_size):
+            chunk = victims[i:i + self.batch_size]
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"DELETE FROM {TABLE} WHERE id = ANY(:ids) AND created_at = ANY(:created)"
+                ), {"ids": [v[0] for v in chunk], "created": [v[1] for v in chunk]})
+            time.sleep(self.pause_seconds)
+        return len(victims)
+
+    async def run_scheduled(self, interval: int = SNAPSHOT_PRUNE_INTERVAL, prune: bool = True):
+        """
+        Roll partitions forward (and prune, if `prune`) every `interval` seconds.
+
+        Every worker runs this loop, but each pass takes a cluster-wide lock
+        that is kept for the whole interval, so only one worker does the
+        work per interval.
+        """
+        while True:
+            if try_lock("snapshot_maintenance", ttl=interval) is not None:
+                try:
+                    await asyncio.to_thread(ensure_partitions)
+                    if prune:
+                        report = await asyncio.to_thread(self.prune)
+                        print(f"🧹 Snapshot pruning finished: {report}")
+                except Exception as e:
+                    print(f"⚠️ Snapshot maintenance failed: {e}")
+            await asyncio.sleep(interval)
+
+
+# Global instance
+snapshot_pruner = SnapshotPruner()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="graph_snapshots partitioning and retention")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Move an unpartitioned table into monthly partitions")
+    migrate.add_argument("--batch", type=int, default=1000, help="Rows copied per transaction")
+    migrate.add_argument("--keep-legacy", action="store_true", help="Keep graph_snapshots_legacy afterwards")
+    sub.add_parser("partitions", help="Create upcoming monthly partitions")
+    sub.add_parser("prune", help="Apply the retention policy once")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_legacy_table(batch_size=args.batch, keep_legacy=args.keep_legacy)
+    elif args.command == "partitions":
+        ensure_partitions()
+    else:
+        print(snapshot_pruner.prune())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
+from sqlalchemy import func
 from app.core.db import SessionLocal
+from app.core.graph_events import publish_event
+from app.core.locks import redis_lock
 from app.models.graph_snapshot import GraphSnapshot
+from app.services.graph_diff import GraphDiff
 
 class SnapshotService:
 
     @staticmethod
-    def save_snapshot(system: str, version: int, state: dict):
+    def version_lock(systems: list):
+        """
+        Hold from reading a system's latest version until its next version is
+        saved, so concurrent requests on any worker can't both save N+1 (or
+        merge into the same stale base). A partitioned table can't carry a
+        unique (system, version) constraint, hence a Redis lock.
+        """
+        return redis_lock([f"snapshot:{system}" for system in systems])
+
+    @staticmethod
+    def save_snapshot(system: str, version: int, state: dict, prev_state: dict | None = None):
         db = SessionLocal()
         snapshot = GraphSnapshot(
             system=system,
@@ -15,14 +29,93 @@ class SnapshotService:
         db.commit()
         db.close()
 
+        SnapshotService.notify(state, prev_state)
+
+    @staticmethod
+    def notify(state: dict, prev_state: dict | None = None):
+        """
+        Push the change to live subscribers; never fails the save.
+
+        A diff only carries additions, so it is sent for expansions that keep
+        every previous node and edge. Rebuilds (which may drop or rename
+        nodes) and anything else that removes items go out as a full snapshot.
+        """
+        event = {
+            "system": state["system"],
+            "version": state["version"],
+            "metadata": state.get("metadata", {})
+        }
+        rebuilt = event["metadata"].get("last_action") == "build_graph"
+        if prev_state and not rebuilt and GraphDiff.is_additive(prev_state, state):
+            diff = GraphDiff.compute_diff(prev_state, state)
+            event.update(type="diff", base_version=prev_state["version"], **diff)
+        else:
+            event.update(type="snapshot", nodes=state["nodes"], edges=state["edges"])
+
+        try:
+            publish_event(event)
+        except Exception as e:
+            print(f"⚠️ Failed to publish graph update for {state['system']}: {e}")
+
+    @staticmethod
+    def save_snapshots(states: list):
+        """Persist many canonical states in a single bulk insert"""
+        if not states:
+            return
+        db = SessionLocal()
+        try:
+            db.add_all([
+                GraphSnapshot(
+                    system=state["system"],
+                    version=state["version"],
+                    state=state
+                )
+                for state in states
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+        for state in states:
+            SnapshotService.notify(state)
+
     @staticmethod
     def load_latest(system: str) -> dict | None:
         db = SessionLocal()
         snapshot = (
             db.query(GraphSnapshot)
             .filter(GraphSnapshot.system == system)
-            .order_by(GraphSnapshot.version.desc())
+            .order_by(GraphSnapshot.version.desc(), GraphSnapshot.created_at.desc())
             .first()
         )
         db.close()
         return snapshot.state if snapshot else None
+
+    @staticmethod
+    def load_version(system: str, version: int) -> dict | None:
+        db = SessionLocal()
+        try:
+            snapshot = (
+                db.query(GraphSnapshot)
+                .filter(GraphSnapshot.system == system, GraphSnapshot.version == version)
+                .order_by(GraphSnapshot.created_at.desc())
+                .first()
+            )
+        finally:
+            db.close()
+        return snapshot.state if snapshot else None
+
+    @staticmethod
+    def latest_versions(systems: list) -> dict:
+        """Latest saved version per system, in one grouped query"""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(GraphSnapshot.system, func.max(GraphSnapshot.version))
+                .filter(GraphSnapshot.system.in_(systems))
+                .group_by(GraphSnapshot.system)
+                .all()
+            )
+        finally:
+            db.close()
+        return {system: version for system, version in rows}
@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+from collections import Counter
+
+from app.llm.client import call_llm_multi, build_prompt
+from app.core.cache import redis_client, get_cached_responses, make_cache_key
+from app.core.config import SPECULATION_TOP_N, CACHE_HARD_TTL
+from app.core.cost_monitor import cost_monitor
+from app.core.rate_limiter import llm_concurrency
+
+STATS_KEY = "spec:stats"
+SPECULATION_TTL = 3600  # Upper bound on one run, incl. waiting for LLM capacity
+
+
+class SpeculativeExpander:
+    """
+    Pre-compute expansions of the nodes a user is likely to open next.
+
+    Runs as a low-priority background task after /build-graph: candidates
+    share one batched LLM call, which waits while user traffic holds half the
+    LLM slots and is capped by CostMonitor's separate speculative budget.
+
+    Runs are versioned per system in Redis (spec:gen:<system>): a rebuild or
+    DELETE /speculation on any worker bumps the generation, and a run whose
+    generation is stale stops before its LLM call.
+    """
+
+    def __init__(self, top_n: int = SPECULATION_TOP_N):
+        self.top_n = top_n
+        self._tasks = {}  # system -> asyncio.Task
+
+    @staticmethod
+    def rank_candidates(state: dict, top_n: int) -> list:
+        """Expandable nodes by degree (desc), then level (asc)"""
+        degree = Counter()
+        for edge in state["edges"]:
+            degree[edge["source"]] += 1
+            degree[edge["target"]] += 1
+        candidates = [n for n in state["nodes"] if n.get("expandable")]
+        candidates.sort(key=lambda n: (-degree[n["id"]], n.get("level", 0), n["id"]))
+        return candidates[:top_n]
+
+    @staticmethod
+    def speculation_key(prompt: str) -> str:
+        return f"spec:{make_cache_key(prompt)}"
+
+    @staticmethod
+    def _supersede(system: str) -> tuple:
+        """Invalidate runs on every worker; returns (new generation, whether one was pending)"""
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incr(f"spec:gen:{system}")
+        pipe.expire(f"spec:gen:{system}", SPECULATION_TTL)
+        pipe.delete(f"spec:pending:{system}")
+        generation, _, pending = pipe.execute()
+        return generation, bool(pending)
+
+    @staticmethod
+    def _is_current(system: str, generation: int) -> bool:
+        return int(redis_client.get(f"spec:gen:{system}") or 0) == generation
+
+    def schedule(self, state: dict) -> int:
+        """Start speculating for a freshly built graph; returns nodes queued"""
+        if self.top_n <= 0:
+            return 0
+        system = state["system"]
+        # A rebuild supersedes older speculation, on any worker
+        generation, _ = self._supersede(system)
+        self._cancel_local(system)
+
+        labels = [n["label"] for n in self.rank_candidates(state, self.top_n)]
+        if not labels:
+            return 0
+        redis_client.set(f"spec:pending:{system}", generation, ex=SPECULATION_TTL)
+        # Fresh context, so speculation isn't billed to the triggering request
+        task = asyncio.create_task(self._run(system, labels, generation), context=contextvars.Context())
+        self._tasks[system] = task
+        task.add_done_callback(
+            lambda t: self._tasks.pop(system, None) if self._tasks.get(system) is t else None
+        )
+        return len(labels)
+
+    def cancel(self, system: str) -> bool:
+        """Stop speculation for a system on every worker; True if any was pending"""
+        _, pending = self._supersede(system)
+        return self._cancel_local(system) or pending
+
+    def _cancel_local(self, system: str) -> bool:
+        task = self._tasks.pop(system, None)
+        if task and not task.done():
+            task.cancel()
+            return True
+        return False
+
+    async def _run(self, system: str, labels: list, generation: int):
+        try:
+            await self._speculate(system, labels, generation)
+        finally:
+            if self._is_current(system, generation):
+                redis_client.delete(f"spec:pending:{system}")
+
+    async def _speculate(self, system: str, labels: list, generation: int):
+        cached = get_cached_responses([build_prompt(f"{system}::{label}") for label in labels])
+        missing = [label for label, hit in zip(labels, cached) if not hit]
+        if len(missing) < len(labels):
+            redis_client.hincrby(STATS_KEY, "already_cached", len(labels) - len(missing))
+        if not missing:
+            return
+        if not cost_monitor.check_speculative_budget():
+            redis_client.hincrby(STATS_KEY, "skipped_budget", len(missing))
+            return
+
+        # Yield to user traffic; a newer build or a cancel may win meanwhile
+        while (
+            llm_concurrency.in_flight() * 2 >= llm_concurrency.max_in_flight
+            and self._is_current(system, generation)
+        ):
+            await asyncio.sleep(2)
+        if not self._is_current(system, generation):
+            redis_client.hincrby(STATS_KEY, "superseded", len(missing))
+            return
+
+        # All candidates share one LLM call (see call_llm_multi)
+        try:
+            designs = await call_llm_multi(system, missing, use_cache=False, speculative=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Speculative expansion failed for {system}: {e}")
+            redis_client.hincrby(STATS_KEY, "failed", len(missing))
+            return
+
+        pipe = redis_client.pipeline(transaction=False)
+        for label, design in designs.items():
+            if isinstance(design, BaseException):
+                print(f"⚠️ Speculative expansion failed for {system}::{label}: {design}")
+                pipe.hincrby(STATS_KEY, "failed", 1)
+                continue
+            pipe.setex(self.speculation_key(build_prompt(f"{system}::{label}")), CACHE_HARD_TTL, 1)
+            pipe.hincrby(STATS_KEY, "speculated", 1)
+        pipe.execute()
+
+    def note_expansion(self, system: str, node_label: str):
+        """Count a user expansion that was served by a speculative entry"""
+        key = self.speculation_key(build_prompt(f"{system}::{node_label}"))
+        if redis_client.delete(key):
+            redis_client.hincrby(STATS_KEY, "hits", 1)
+
+    def get_stats(self) -> dict:
+        stats = {k: int(v) for k, v in redis_client.hgetall(STATS_KEY).items()}
+        speculated = stats.get("speculated", 0)
+        hits = stats.get("hits", 0)
+        return {
+            "top_n": self.top_n,
+            "running": len(self._tasks),
+            "speculated": speculated,
+            "hits": hits,
+            "hit_rate_percent": round(hits / speculated * 100, 2) if speculated else 0.0,
+            "already_cached": stats.get("already_cached", 0),
+            "failed": stats.get("failed", 0),
+            "skipped_budget": stats.get("skipped_budget", 0),
+            "superseded": stats.get("superseded", 0)
+        }
+
+
+# Global instance
+speculator = SpeculativeExpander()
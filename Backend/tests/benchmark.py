@@ -30,13 +30,52 @@ async def benchmark_endpoint(endpoint: str, payload: dict, iterations: int = 10)
         }
     return None
 
+async def llm_usage(client: httpx.AsyncClient) -> dict:
+    response = await client.get(f"{BASE_URL}/metrics")
+    return response.json()["llm_usage"]
+
+
+async def compare_multi_expand(labels: list):
+    """LLM calls, tokens and wall time: k x /expand-node vs 1 x /expand-nodes"""
+    async with httpx.AsyncClient(timeout=120) as client:
+        for mode, system in (("single", "BenchSingle"), ("batched", "BenchBatched")):
+            await client.post(f"{BASE_URL}/build-graph", json={"system_name": system})
+            before = await llm_usage(client)
+            start = time.time()
+            if mode == "single":
+                for label in labels:
+                    await client.post(f"{BASE_URL}/expand-node", json={
+                        "system": system,
+                        "node_id": label.lower().replace(" ", "_"),
+                        "node_label": label
+                    })
+            else:
+                await client.post(f"{BASE_URL}/expand-nodes", json={
+                    "system": system,
+                    "nodes": [
+                        {"node_id": label.lower().replace(" ", "_"), "node_label": label}
+                        for label in labels
+                    ]
+                })
+            duration = time.time() - start
+            after = await llm_usage(client)
+            tokens = (
+                after["prompt_tokens"] + after["completion_tokens"]
+                - before["prompt_tokens"] - before["completion_tokens"]
+            )
+            print(
+                f"  {mode:>7}: {after['total_calls'] - before['total_calls']} LLM calls, "
+                f"{tokens} tokens, {duration:.2f}s"
+            )
+    print()
+
 async def main():
     print("🔥 ArchViz AI Performance Benchmark\n")
     
     # Test 1: Build Graph (Cold Start)
     print("Test 1: Build Graph (Cold Start)")
     stats = await benchmark_endpoint(
-        "/design/build-graph",
+        "/build-graph",
         {"system_name": "TestSystem1"},
         iterations=5
     )
@@ -49,7 +88,7 @@ async def main():
     # Test 2: Build Graph (Cached)
     print("Test 2: Build Graph (Cached - Same System)")
     stats = await benchmark_endpoint(
-        "/design/build-graph",
+        "/build-graph",
         {"system_name": "TestSystem1"},
         iterations=5
     )
@@ -60,7 +99,7 @@ async def main():
     # Test 3: Expand Node
     print("Test 3: Expand Node")
     stats = await benchmark_endpoint(
-        "/design/expand-node",
+        "/expand-node",
         {
             "system": "TestSystem1",
             "node_id": "test_node",
@@ -73,9 +112,13 @@ async def main():
         print(f"  Mean: {stats['mean']:.2f}s")
         print(f"  Median: {stats['median']:.2f}s\n")
     
+    # Test 4: Multi-node expansion, one call per node vs one batched call
+    print("Test 4: Expand 4 Nodes (single calls vs /expand-nodes)")
+    await compare_multi_expand(["Gateway", "Auth Service", "Order Service", "Database"])
+
     # Get final metrics
     async with httpx.AsyncClient() as client:
-        response = await client.get(f"{BASE_URL}/design/metrics")
+        response = await client.get(f"{BASE_URL}/metrics")
         metrics = response.json()
         print("📊 Final Metrics:")
         print(f"  Cache Hit Rate: {metrics['cache']['hit_rate_percent']}%")
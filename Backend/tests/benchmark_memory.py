@@ -0,0 +1,66 @@
+"""
+Memory footprint of a large merged graph: plain dicts vs Node/Edge objects.
+
+Run from Backend/:  python -m tests.benchmark_memory [nodes]
+"""
+import json
+import sys
+import tracemalloc
+
+from app.graph.model import Node, Edge, to_nodes, to_edges
+
+TYPES = ["frontend", "backend", "database", "cache", "gateway", "queue", "worker", "storage"]
+
+
+def make_state_json(n: int) -> str:
+    """A stored snapshot; both variants start from json.loads, like the database"""
+    nodes = [
+        {
+            "id": f"component_{i}",
+            "label": f"Component {i}",
+            "description": "Handles one part of the system",
+            "type": TYPES[i % len(TYPES)],
+            "level": i % 12,
+            "expandable": True
+        }
+        for i in range(n)
+    ]
+    edges = []
+    for i in range(1, n):
+        for parent in {i // 2, i - 1}:
+            src, tgt = f"component_{parent}", f"component_{i}"
+            edges.append({"id": f"{src}-{tgt}", "source": src, "target": tgt, "relation": "depends_on"})
+    return json.dumps({"nodes": nodes, "edges": edges})
+
+
+def measure(build) -> tuple:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"🧮 Graph memory benchmark: {n} nodes\n")
+
+    raw = make_state_json(n)
+
+    def load_compact():
+        state = json.loads(raw)
+        return to_nodes(state["nodes"]), to_edges(state["edges"])
+
+    state, dict_bytes = measure(lambda: json.loads(raw))
+    (nodes, edges), compact_bytes = measure(load_compact)
+    assert isinstance(nodes[0], Node) and isinstance(edges[0], Edge)
+
+    print(f"  Edges: {len(edges)}")
+    print(f"  dicts:     {dict_bytes / 1e6:8.1f} MB  ({dict_bytes / n:6.0f} B per node incl. edges)")
+    print(f"  Node/Edge: {compact_bytes / 1e6:8.1f} MB  ({compact_bytes / n:6.0f} B per node incl. edges)")
+    print(f"  Saving:    {(1 - compact_bytes / dict_bytes) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
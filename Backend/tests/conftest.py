@@ -0,0 +1,28 @@
+import os
+
+import fakeredis
+import pytest
+import redis
+
+# app.llm.client and app.core.db read these at import time; no test talks
+# to either the provider or the database
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/archviz_test")
+
+# Module-level clients (cache, cost monitor, rate limiters, job queue) are
+# created with Redis.from_url at import time; point them all at one
+# in-memory server. Needs `pip install "fakeredis[lua]"` for the Lua scripts.
+_server = fakeredis.FakeServer()
+
+
+def _fake_from_url(cls, url, **kwargs):
+    return fakeredis.FakeRedis(server=_server, **kwargs)
+
+
+redis.Redis.from_url = classmethod(_fake_from_url)
+
+
+@pytest.fixture(autouse=True)
+def flush_redis():
+    fakeredis.FakeRedis(server=_server).flushall()
+    yield
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from app.core import cache
+from app.core.cache import (
+    redis_client, make_cache_key, get_cached_entry, set_cached_response,
+    record_system_request, get_top_systems,
+)
+from app.core.config import CACHE_REFRESH_MIN_HITS
+from app.llm import client
+from app.llm.client import build_prompt, call_llm
+
+OLD = {"system": "Chat", "components": [{"name": "API"}], "edges": []}
+NEW = {"system": "Chat", "components": [{"name": "API"}, {"name": "DB"}], "edges": []}
+
+
+def fake_generate(monkeypatch, calls: list):
+    async def generate(system_name, prompt, use_negative_cache=True, speculative=False):
+        calls.append(system_name)
+        set_cached_response(prompt, NEW)
+        return NEW
+
+    monkeypatch.setattr(client, "_generate", generate)
+
+
+def test_miss_does_not_count_a_hit():
+    prompt = build_prompt("Chat")
+
+    assert get_cached_entry(prompt) is None
+    assert not redis_client.exists(f"{make_cache_key(prompt)}:hits")
+
+    set_cached_response(prompt, OLD)
+    assert get_cached_entry(prompt) == (OLD, False, 1)
+    assert get_cached_entry(prompt) == (OLD, False, 2)
+
+
+def test_fresh_entry_is_served_without_refresh(monkeypatch):
+    calls = []
+    fake_generate(monkeypatch, calls)
+    set_cached_response(build_prompt("Chat"), OLD)
+
+    async def scenario():
+        return [await call_llm("Chat") for _ in range(CACHE_REFRESH_MIN_HITS + 1)]
+
+    assert asyncio.run(scenario()) == [OLD] * (CACHE_REFRESH_MIN_HITS + 1)
+    assert calls == []
+
+
+def test_hot_stale_entry_is_served_and_refreshed_once(monkeypatch):
+    calls = []
+    fake_generate(monkeypatch, calls)
+    set_cached_response(build_prompt("Chat"), OLD, soft_ttl=0)
+
+    async def scenario():
+        served = [await call_llm("Chat") for _ in range(CACHE_REFRESH_MIN_HITS)]
+        await asyncio.gather(*client._refresh_tasks.values())
+        return served
+
+    # Cold stale reads don't refresh; the read that makes it hot does
+    assert asyncio.run(scenario()) == [OLD] * CACHE_REFRESH_MIN_HITS
+    assert calls == ["Chat"]
+    assert get_cached_entry(build_prompt("Chat"))[:2] == (NEW, False)
+    assert not redis_client.exists(f"{make_cache_key(build_prompt('Chat'))}:refresh")
+
+
+def test_hard_expired_entry_is_regenerated(monkeypatch):
+    calls = []
+    fake_generate(monkeypatch, calls)
+    prompt = build_prompt("Chat")
+    set_cached_response(prompt, OLD)
+    redis_client.pexpire(make_cache_key(prompt), 1)
+    time.sleep(0.01)
+
+    assert asyncio.run(call_llm("Chat")) == NEW
+    assert calls == ["Chat"]
+
+
+def test_top_systems_sum_the_last_days_and_forget_older_ones():
+    today = datetime.utcnow()
+    for _ in range(3):
+        record_system_request("Chat")
+    record_system_request("Shop")
+    redis_client.zincrby(cache._request_stats_key(today - timedelta(days=1)), 5, "Shop")
+    redis_client.zincrby(cache._request_stats_key(today - timedelta(days=cache.REQUEST_STATS_DAYS)), 100, "Old")
+
+    assert get_top_systems(10) == ["Shop", "Chat"]
+    assert get_top_systems(1) == ["Shop"]
+    assert 0 < redis_client.ttl(cache._request_stats_key(today)) <= cache.REQUEST_STATS_DAYS * 86400
+
+
+def test_request_stats_are_trimmed_to_the_most_requested(monkeypatch):
+    monkeypatch.setattr(cache, "REQUEST_STATS_MAX_ENTRIES", 2)
+    for _ in range(3):
+        record_system_request("Popular")
+    for i in range(10):
+        record_system_request(f"One-off {i}")
+
+    assert redis_client.zcard(cache._request_stats_key(datetime.utcnow())) <= 4
+    assert get_top_systems(1) == ["Popular"]
+
@@ -0,0 +1,132 @@
+import asyncio
+
+from app.core.cache import make_cache_key, redis_client, set_cached_response, record_system_request
+from app.core.cost_monitor import cost_monitor
+from app.llm.client import BatchUnansweredError, build_prompt
+from app.services import cache_warmer as warmer_module
+from app.services.cache_warmer import CacheWarmer
+
+DESIGN = {"components": [{"name": "API", "type": "backend"}], "edges": []}
+PAID_CALL = {"prompt_tokens": 1_000_000, "completion_tokens": 0}  # $0.075
+
+
+def fake_llm(monkeypatch, calls: list):
+    async def call_llm(name, use_cache=True):
+        calls.append(name)
+        cost_monitor.record_call(name, usage=PAID_CALL)
+        set_cached_response(build_prompt(name), DESIGN)
+        return DESIGN
+
+    monkeypatch.setattr(warmer_module, "call_llm", call_llm)
+
+
+def test_already_warm_systems_are_skipped(monkeypatch):
+    calls = []
+    fake_llm(monkeypatch, calls)
+    for name in ("Chat", "Shop", "Video"):
+        record_system_request(name)
+    set_cached_response(build_prompt("Shop"), DESIGN)
+
+    report = asyncio.run(CacheWarmer(calls_per_minute=6000).warm(limit=10, seed_file=None, expand_nodes=False))
+
+    assert sorted(calls) == ["Chat", "Video"]
+    assert (report["warmed"], report["already_cached"], report["failed"]) == (2, 1, 0)
+    assert report["cost_usd"] == 0.15
+
+
+def test_spend_cap_counts_only_the_warmers_own_calls(monkeypatch):
+    calls = []
+    fake_llm(monkeypatch, calls)
+    for i in range(10):
+        record_system_request(f"System {i}")
+
+    async def scenario():
+        warmer = CacheWarmer(calls_per_minute=6000, max_cost=0.2)
+
+        async def user_traffic():
+            for _ in range(20):
+                cost_monitor.record_call("User", usage=PAID_CALL)
+                await asyncio.sleep(0)
+
+        report, _ = await asyncio.gather(
+            warmer.warm(limit=10, seed_file=None, expand_nodes=False),
+            user_traffic()
+        )
+        return report
+
+    report = asyncio.run(scenario())
+
+    # Admission is checked before each call: $0.15 spent still admits a third
+    assert len(calls) == 3
+    assert report["stopped_on_budget"] is True
+    assert report["cost_usd"] == 0.225
+
+
+def test_stale_or_expiring_entries_are_regenerated(monkeypatch):
+    calls = []
+    fake_llm(monkeypatch, calls)
+    for name in ("Stale", "Expiring", "Fresh"):
+        record_system_request(name)
+    set_cached_response(build_prompt("Stale"), DESIGN, ttl=30, soft_ttl=0)
+    set_cached_response(build_prompt("Expiring"), DESIGN, ttl=2 * 3600)
+    set_cached_response(build_prompt("Fresh"), DESIGN)
+
+    report = asyncio.run(CacheWarmer(calls_per_minute=6000).warm(limit=10, seed_file=None, expand_nodes=False))
+
+    assert sorted(calls) == ["Expiring", "Stale"]
+    assert (report["warmed"], report["already_cached"]) == (2, 1)
+
+
+def test_each_node_batch_and_fallback_is_admitted(monkeypatch):
+    calls = []
+    fake_llm(monkeypatch, calls)
+    labels = [f"Service {i}" for i in range(8)]
+    system_design = {"components": [{"name": label, "type": "backend"} for label in labels], "edges": []}
+    set_cached_response(build_prompt("Shop"), system_design)
+    record_system_request("Shop")
+
+    batches = []
+
+    async def call_llm_multi(system, chunk, use_cache=True, speculative=False, fallback=True):
+        assert fallback is False
+        batches.append(list(chunk))
+        cost_monitor.record_call(system, usage=PAID_CALL)
+        # The batch leaves its first node unanswered
+        return {
+            label: BatchUnansweredError(label) if j == 0 else DESIGN
+            for j, label in enumerate(chunk)
+        }
+
+    monkeypatch.setattr(warmer_module, "call_llm_multi", call_llm_multi)
+    monkeypatch.setattr(warmer_module, "EXPAND_BATCH_MAX_NODES", 3)
+
+    warmer = CacheWarmer(calls_per_minute=6000)
+    admitted = []
+    admit = warmer._admit
+
+    async def counting_admit(report, spend):
+        allowed = await admit(report, spend)
+        admitted.append(allowed)
+        return allowed
+
+    warmer._admit = counting_admit
+    report = asyncio.run(warmer.warm(limit=1, seed_file=None, expand_nodes=True))
+
+    # Three batches of up to 3 nodes, each followed by one single-node retry
+    assert [len(batch) for batch in batches] == [3, 3, 2]
+    assert calls == ["Shop::Service 0", "Shop::Service 3", "Shop::Service 6"]
+    assert admitted == [True] * 6
+    assert (report["warmed"], report["already_cached"]) == (8, 1)
+
+    # $0.075 after the first batch still admits its retry; then the cap stops
+    # the warmer before the second batch
+    batches.clear()
+    calls.clear()
+    for label in labels:
+        redis_client.delete(make_cache_key(build_prompt(f"Shop::{label}")))
+    report = asyncio.run(CacheWarmer(calls_per_minute=6000, max_cost=0.1).warm(
+        limit=1, seed_file=None, expand_nodes=True
+    ))
+
+    assert len(batches) == 1 and calls == ["Shop::Service 0"]
+    assert report["stopped_on_budget"] is True
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from app.core import cost_monitor as cost_module
+from app.core.cache import redis_client
+from app.core.cost_monitor import CostMonitor
+
+MTOK = {"prompt_tokens": 1_000_000, "completion_tokens": 0}  # $0.075
+
+
+def test_budget_applies_to_todays_spend_only():
+    monitor = CostMonitor(redis_client)
+    redis_client.hset(CostMonitor.TOTAL_KEY, "usd", 500)  # Lifetime spend far over budget
+
+    assert monitor.check_budget_limit(max_cost=0.1)
+    monitor.record_call("Chat", usage=MTOK)
+    assert monitor.check_budget_limit(max_cost=0.1)
+    monitor.record_call("Chat", usage=MTOK)
+    assert not monitor.check_budget_limit(max_cost=0.1)
+
+
+def test_per_system_costs_are_bucketed_per_day_and_trimmed(monkeypatch):
+    monkeypatch.setattr(cost_module, "BY_SYSTEM_MAX_ENTRIES", 2)
+    monitor = CostMonitor(redis_client)
+    key = f"cost:by_system:{datetime.utcnow().strftime('%Y-%m-%d')}"
+
+    for calls, system in zip([5, 4, 3, 2], "ABCD"):
+        for _ in range(calls):
+            monitor.record_call(system, usage=MTOK)
+    assert redis_client.zcard(key) == 4  # Within the slack, nothing trimmed
+
+    monitor.record_call("E", usage=MTOK)
+    assert redis_client.zrevrange(key, 0, -1) == ["A", "B"]
+    assert 0 < redis_client.ttl(key) <= cost_module.BY_SYSTEM_RETENTION
+    assert list(monitor.get_stats()["top_systems_today_usd"]) == ["A", "B"]
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.core.cache import set_cached_response
+from app.llm.client import build_prompt
+from app.services import design_service
+from app.services.design_service import DesignService
+
+DESIGN = {
+    "components": [
+        {"name": "API", "type": "backend"},
+        {"name": "DB", "type": "database"}
+    ],
+    "edges": [{"from": "API", "to": "DB"}]
+}
+
+
+def run_batch(monkeypatch, save):
+    async def failing_llm(name, use_cache=True):
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(design_service, "call_llm", failing_llm)
+    monkeypatch.setattr(design_service.SnapshotService, "latest_versions", staticmethod(lambda names: {}))
+    monkeypatch.setattr(design_service.SnapshotService, "save_snapshots", staticmethod(save))
+    for name in ("Chat", "Shop"):
+        set_cached_response(build_prompt(name), DESIGN)
+
+    async def collect():
+        return [item async for item in DesignService.build_graphs_batch(["Chat", "Shop", "Video"])]
+
+    return asyncio.run(collect())
+
+
+def test_ok_items_are_saved_before_they_are_streamed(monkeypatch):
+    saved = []
+    items = run_batch(monkeypatch, lambda states: saved.extend(s["system"] for s in states))
+
+    by_system = {item["system"]: item for item in items[:-1]}
+    assert by_system["Chat"]["status"] == "ok" and by_system["Chat"]["cached"]
+    assert by_system["Chat"]["state"]["version"] == 1
+    assert by_system["Video"] == {"system": "Video", "status": "error", "error": "LLM down"}
+    assert sorted(saved) == ["Chat", "Shop"]
+    assert items[-1] == {"status": "done", "requested": 3, "saved": 2, "failed": 1}
+
+
+def test_failed_save_is_streamed_as_errors(monkeypatch):
+    def save(states):
+        if states:
+            raise RuntimeError("database unavailable")
+
+    items = run_batch(monkeypatch, save)
+
+    assert all(item["status"] == "error" and "state" not in item for item in items[:-1])
+    assert {item["error"] for item in items[:-1] if item["system"] != "Video"} == {
+        "Failed to save snapshot: database unavailable"
+    }
+    assert items[-1] == {"status": "done", "requested": 3, "saved": 0, "failed": 3}
@@ -0,0 +1,62 @@
+import asyncio
+import copy
+import threading
+import time
+
+from app.services import design_service
+from app.services.design_service import DesignService
+from app.services.graph_state import build_canonical_state
+
+
+class FakeSnapshots:
+    """In-memory graph_snapshots with a slow read, to widen the race window"""
+
+    def __init__(self):
+        self.rows = []
+
+    def load_latest(self, system):
+        rows = [r for r in self.rows if r["system"] == system]
+        latest = copy.deepcopy(max(rows, key=lambda r: r["version"])) if rows else None
+        time.sleep(0.05)
+        return latest
+
+    def save_snapshot(self, system, version, state, prev_state=None):
+        self.rows.append(copy.deepcopy(state))
+
+
+def test_concurrent_expansions_get_distinct_versions_and_both_merge(monkeypatch):
+    store = FakeSnapshots()
+    store.rows.append(build_canonical_state(
+        system="Shop",
+        nodes=[
+            {"id": "api", "label": "API", "type": "backend", "level": 0},
+            {"id": "db", "label": "DB", "type": "database", "level": 1}
+        ],
+        edges=[{"source": "api", "target": "db"}],
+        last_action="build_graph"
+    ))
+    monkeypatch.setattr(design_service.SnapshotService, "load_latest", staticmethod(store.load_latest))
+    monkeypatch.setattr(design_service.SnapshotService, "save_snapshot", staticmethod(store.save_snapshot))
+
+    async def call_llm(system_name, use_cache=True):
+        label = system_name.split("::")[1]
+        return {"components": [{"name": f"{label} Worker", "type": "worker"}], "edges": []}
+
+    monkeypatch.setattr(design_service, "call_llm", call_llm)
+
+    def expand(node_id, label):
+        # Each thread plays a separate API worker with its own event loop
+        asyncio.run(DesignService.expand_node("Shop", node_id, label, max_depth=1))
+
+    threads = [
+        threading.Thread(target=expand, args=("api", "API")),
+        threading.Thread(target=expand, args=("db", "DB"))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(r["version"] for r in store.rows) == [1, 2, 3]
+    latest = store.load_latest("Shop")
+    assert {"api_worker", "db_worker"} <= {n["id"] for n in latest["nodes"]}
@@ -0,0 +1,79 @@
+import asyncio
+
+from app.api import design as design_api
+from app.core.graph_events import get_history
+from app.graph.model import Edge, Node
+from app.services.graph_state import build_canonical_state
+from app.services.snapshot_service import SnapshotService
+
+
+def state(version, node_ids, edges, last_action, parent_node=None):
+    return build_canonical_state(
+        system="Chat",
+        nodes=[Node(n, n) for n in node_ids],
+        edges=[Edge(s, t, "calls") for s, t in edges],
+        last_action=last_action,
+        parent_node=parent_node,
+        version=version
+    )
+
+
+def apply(view: dict, event: dict):
+    """What a WebSocket client does with each message"""
+    if event["type"] == "snapshot":
+        view.update(nodes={n["id"] for n in event["nodes"]}, edges=len(event["edges"]))
+    else:
+        view["nodes"] |= {n["id"] for n in event["added_nodes"]}
+        view["edges"] += len(event["added_edges"])
+    view["version"] = event["version"]
+
+
+V1 = state(1, ["api", "db", "cache"], [("api", "db"), ("api", "cache")], "build_graph")
+V2 = state(2, ["api", "db", "cache", "api__worker"], [("api", "db"), ("api", "cache"), ("api", "api__worker")],
+           "expand_node", parent_node="api")
+V3 = state(3, ["api", "db"], [("api", "db")], "build_graph")
+
+
+def test_rebuild_that_drops_nodes_replaces_the_subscribers_view():
+    SnapshotService.notify(V1)
+    SnapshotService.notify(V2, V1)
+    SnapshotService.notify(V3, V2)
+
+    events = get_history("Chat")
+    assert [e["type"] for e in events] == ["snapshot", "diff", "snapshot"]
+
+    view = {}
+    for event in events:
+        apply(view, event)
+    assert view == {"nodes": {"api", "db"}, "edges": 1, "version": 3}
+
+
+def test_expansion_that_removes_an_edge_is_sent_as_a_snapshot():
+    shrunk = state(2, ["api", "db", "cache"], [("api", "db")], "expand_node", parent_node="api")
+    SnapshotService.notify(shrunk, V1)
+
+    assert get_history("Chat")[-1]["type"] == "snapshot"
+
+
+def test_reconnecting_subscriber_catches_up_past_a_rebuild(monkeypatch):
+    SnapshotService.notify(V1)
+    SnapshotService.notify(V2, V1)
+    SnapshotService.notify(V3, V2)
+    monkeypatch.setattr(SnapshotService, "load_latest", staticmethod(lambda system: dict(V3)))
+    monkeypatch.setattr(SnapshotService, "latest_versions", staticmethod(lambda systems: {"Chat": 3}))
+
+    class FakeWebSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send_json(self, message):
+            self.sent.append(message)
+
+    websocket = FakeWebSocket()
+    view = {"nodes": {"api", "db", "cache"}, "edges": 2, "version": 1}
+    last_version = asyncio.run(design_api._catch_up(websocket, "Chat", since_version=1))
+
+    for message in websocket.sent:
+        apply(view, message)
+    assert last_version == 3
+    assert view == {"nodes": {"api", "db"}, "edges": 1, "version": 3}
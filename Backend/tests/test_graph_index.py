@@ -0,0 +1,54 @@
+import pytest
+
+from app.graph.index import GraphIndex
+
+state = {
+    "system": "Shop",
+    "version": 3,
+    "nodes": [
+        {"id": "web", "type": "frontend", "level": 0},
+        {"id": "api", "type": "backend", "level": 1},
+        {"id": "orders", "type": "backend", "level": 2},
+        {"id": "db", "type": "database", "level": 3},
+        {"id": "audit", "type": "backend", "level": 3},
+    ],
+    "edges": [
+        {"id": "web-api", "source": "web", "target": "api"},
+        {"id": "api-orders", "source": "api", "target": "orders"},
+        {"id": "orders-db", "source": "orders", "target": "db"},
+        {"id": "orders-audit", "source": "orders", "target": "audit"},
+    ],
+}
+
+
+def test_k_hop_neighborhood():
+    index = GraphIndex(state)
+
+    one_hop = index.neighborhood("api", k=1)
+    assert {n["id"] for n in one_hop["nodes"]} == {"web", "api", "orders"}
+    assert {e["id"] for e in one_hop["edges"]} == {"web-api", "api-orders"}
+
+    downstream = index.neighborhood("api", k=2, direction="out")
+    assert {n["id"] for n in downstream["nodes"]} == {"api", "orders", "db", "audit"}
+
+
+def test_filters_and_cursor_pagination():
+    index = GraphIndex(state)
+
+    backends = index.page_nodes(None, 10, level_min=1, level_max=3, types={"backend"})
+    assert [n["id"] for n in backends["items"]] == ["api", "orders", "audit"]
+
+    first = index.page_nodes(None, 2)
+    second = index.page_nodes(first["next_cursor"], 2)
+    last = index.page_nodes(second["next_cursor"], 2)
+    assert [n["id"] for n in first["items"] + second["items"] + last["items"]] == [
+        n["id"] for n in state["nodes"]
+    ]
+    assert last["next_cursor"] is None
+
+
+def test_cursor_from_another_version_is_rejected():
+    cursor = GraphIndex(state).page_nodes(None, 2)["next_cursor"]
+    newer = GraphIndex({**state, "version": 4})
+    with pytest.raises(ValueError):
+        newer.page_nodes(cursor, 2)
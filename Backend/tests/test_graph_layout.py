@@ -0,0 +1,68 @@
+from app.graph.layout import GraphLayout
+
+nodes = [
+    {"id": "frontend", "level": 0},
+    {"id": "gateway", "level": 1},
+    {"id": "auth", "level": 2},
+    {"id": "orders", "level": 2},
+    {"id": "db", "level": 3},
+]
+edges = [
+    {"source": "frontend", "target": "gateway"},
+    {"source": "gateway", "target": "auth"},
+    {"source": "gateway", "target": "orders"},
+    {"source": "orders", "target": "db"},
+]
+
+
+def test_layered_uses_level_rows_and_spreads_each_row():
+    positions = GraphLayout(nodes, edges, x_spacing=100, y_spacing=50).layered()
+
+    assert set(positions) == {n["id"] for n in nodes}
+    assert positions["frontend"][1] == 0
+    assert positions["db"][1] == 150
+    assert positions["auth"][1] == positions["orders"][1]
+    assert abs(positions["auth"][0] - positions["orders"][0]) == 100
+
+
+def test_incremental_only_moves_the_new_neighborhood():
+    previous = GraphLayout(nodes, edges).layered()
+    new_nodes = nodes + [{"id": "cache", "level": 3}, {"id": "sessions", "level": 3}]
+    new_edges = edges + [
+        {"source": "auth", "target": "cache"},
+        {"source": "auth", "target": "sessions"},
+    ]
+
+    positions = GraphLayout(new_nodes, new_edges).incremental(
+        previous, ["cache", "sessions"], anchor="auth"
+    )
+
+    for node_id in ("frontend", "gateway", "auth", "orders", "db"):
+        assert positions[node_id] == previous[node_id]
+    assert positions["cache"] != positions["sessions"]
+
+
+def shifted(positions, dx=37.0):
+    """A previous layout that a fresh layered() wouldn't reproduce"""
+    return {node_id: (x + dx, y) for node_id, (x, y) in positions.items()}
+
+
+def test_incremental_without_new_nodes_keeps_every_position():
+    previous = shifted(GraphLayout(nodes, edges).layered())
+    # An expansion whose sub-nodes all merged into existing ids: only edges change
+    new_edges = edges + [{"source": "auth", "target": "db"}]
+
+    positions = GraphLayout(nodes, new_edges).incremental(previous, [], anchor="auth")
+
+    assert positions == previous
+
+
+def test_incremental_without_new_nodes_lays_out_only_unknown_ids():
+    known = [n for n in nodes if n["id"] != "db"]
+    previous = shifted(GraphLayout(known, edges[:-1]).layered())
+
+    positions = GraphLayout(nodes, edges).incremental(previous, [], anchor="orders")
+
+    for node_id in previous:
+        assert positions[node_id] == previous[node_id]
+    assert positions["db"] == GraphLayout(nodes, edges).layered()["db"]
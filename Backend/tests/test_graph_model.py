@@ -0,0 +1,36 @@
+from app.graph.merge import GraphMerger
+from app.graph.model import Node, Edge, to_dicts
+
+
+def test_dict_round_trip_keeps_unknown_keys():
+    data = {"id": "api", "label": "API", "description": "", "type": "backend",
+            "level": 2, "expandable": True, "x": 10.0}
+
+    node = Node.from_dict(data)
+
+    assert node.extra == {"x": 10.0}
+    assert node.to_dict() == data
+    assert Edge.from_dict({"source": "a", "target": "b", "relation": "calls"}).to_dict() == {
+        "id": "a-b", "source": "a", "target": "b", "relation": "calls"
+    }
+
+
+def test_ids_and_types_are_interned():
+    a = Node.from_dict({"id": "".join(["ca", "che"]), "label": "Cache", "type": "".join(["data", "base"])})
+    b = Node.from_dict({"id": "".join(["cac", "he"]), "label": "Cache", "type": "".join(["datab", "ase"])})
+
+    assert a.id is b.id
+    assert a.type is b.type
+
+
+def test_merge_renames_conflicting_ids():
+    base = {"nodes": [{"id": "cache", "label": "Redis"}], "edges": []}
+    subgraph = {
+        "nodes": [Node("cache", "Memcached", level=1), Node("store", "Store", level=1)],
+        "edges": [Edge("store", "cache")]
+    }
+
+    merged = GraphMerger(base).merge("api", subgraph)
+
+    assert [n["id"] for n in to_dicts(merged["nodes"])] == ["cache", "api__cache", "store"]
+    assert [e.id for e in merged["edges"]] == ["store-api__cache"]
@@ -0,0 +1,192 @@
+import asyncio
+import time
+
+from app.core.cache import redis_client
+from app.core.job_queue import JobQueue, InMemoryJobBackend, RedisJobBackend
+
+
+def make_queue(handler, **kwargs):
+    queue = JobQueue(backend=InMemoryJobBackend(), workers=1, **kwargs)
+    queue.register("build_graph", handler)
+    return queue
+
+
+def test_job_runs_and_wait_returns_result():
+    async def handler(system_name):
+        return {"system": system_name}
+
+    async def scenario():
+        queue = make_queue(handler)
+        queue.start()
+        job, deduplicated = await queue.submit("build_graph", {"system_name": "Chat"})
+        done = await queue.wait(job["id"], timeout=5)
+        await queue.stop()
+        return deduplicated, done
+
+    deduplicated, done = asyncio.run(scenario())
+    assert deduplicated is False
+    assert done["status"] == "succeeded"
+    assert done["result"] == {"system": "Chat"}
+
+
+def test_identical_pending_jobs_are_deduplicated():
+    async def handler(system_name):
+        return {}
+
+    async def scenario():
+        queue = make_queue(handler)
+        first, _ = await queue.submit("build_graph", {"system_name": "Chat"})
+        second, deduplicated = await queue.submit("build_graph", {"system_name": "Chat"})
+        other, _ = await queue.submit("build_graph", {"system_name": "Shop"})
+        return first, second, deduplicated, other, await queue.get_stats()
+
+    first, second, deduplicated, other, stats = asyncio.run(scenario())
+    assert deduplicated is True
+    assert second["id"] == first["id"]
+    assert other["id"] != first["id"]
+    assert stats["queue_depth"] == 2
+
+
+def test_failed_job_is_retried_then_marked_failed():
+    calls = []
+
+    async def handler(system_name):
+        calls.append(system_name)
+        raise RuntimeError("LLM down")
+
+    async def scenario():
+        queue = make_queue(handler, max_attempts=2, retry_backoff=0.01)
+        queue.start()
+        job, _ = await queue.submit("build_graph", {"system_name": "Chat"})
+        done = await queue.wait(job["id"], timeout=5)
+        await queue.stop()
+        return done
+
+    done = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert done["status"] == "failed"
+    assert done["error"] == "LLM down"
+
+
+def make_redis_queue(handler, **kwargs):
+    queue = JobQueue(backend=RedisJobBackend(redis_client), workers=1, poll_interval=0.05, **kwargs)
+    queue.register("build_graph", handler)
+    return queue
+
+
+def test_job_of_a_crashed_worker_is_reclaimed():
+    calls = []
+
+    async def handler(system_name):
+        calls.append(system_name)
+        if len(calls) == 1:
+            await asyncio.Event().wait()  # This worker "crashes" mid-job
+        return {"system": system_name}
+
+    async def scenario():
+        crashed = make_redis_queue(handler, lease_seconds=0.2)
+        crashed.start()
+        job, _ = await crashed.submit("build_graph", {"system_name": "Chat"})
+        while not calls:
+            await asyncio.sleep(0.01)
+        await crashed.stop()  # Lease is left to expire
+
+        survivor = make_redis_queue(handler, lease_seconds=0.2)
+        survivor.start()
+        done = await survivor.wait(job["id"], timeout=5)
+        again, deduplicated = await survivor.submit("build_graph", {"system_name": "Chat"})
+        await survivor.stop()
+        return done, survivor.reclaimed, again, deduplicated
+
+    done, reclaimed, again, deduplicated = asyncio.run(scenario())
+    assert done["status"] == "succeeded" and done["attempts"] == 2
+    assert reclaimed == 1
+    # The finished job released its dedup claim
+    assert deduplicated is False and again["id"] != done["id"]
+
+
+def test_reclaimed_job_out_of_attempts_fails():
+    async def handler(system_name):
+        await asyncio.Event().wait()
+
+    async def scenario():
+        crashed = make_redis_queue(handler, lease_seconds=0.2, max_attempts=1)
+        crashed.start()
+        job, _ = await crashed.submit("build_graph", {"system_name": "Chat"})
+        while (await crashed.get(job["id"]))["status"] != "running":
+            await asyncio.sleep(0.01)
+        await crashed.stop()
+
+        survivor = make_redis_queue(handler, lease_seconds=0.2, max_attempts=1)
+        survivor.start()
+        done = await survivor.wait(job["id"], timeout=5)
+        await survivor.stop()
+        return done
+
+    done = asyncio.run(scenario())
+    assert done["status"] == "failed"
+    assert done["error"] == "Worker stopped while running the job"
+
+
+def test_retry_waits_in_the_delayed_set():
+    calls = []
+
+    async def handler(system_name):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RuntimeError("LLM down")
+        return {}
+
+    async def scenario():
+        queue = make_redis_queue(handler, retry_backoff=0.3)
+        queue.start()
+        job, _ = await queue.submit("build_graph", {"system_name": "Chat"})
+        while not calls:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        delayed = redis_client.zscore(RedisJobBackend.DELAYED_KEY, job["id"])
+        done = await queue.wait(job["id"], timeout=5)
+        await queue.stop()
+        return delayed, done
+
+    delayed, done = asyncio.run(scenario())
+    assert delayed is not None
+    assert done["status"] == "succeeded"
+    assert calls[1] - calls[0] >= 0.3
+
+
+def test_job_popped_by_a_worker_that_died_before_running_it_is_reclaimed():
+    async def handler(system_name):
+        return {"system": system_name}
+
+    async def scenario():
+        crashed = make_redis_queue(handler, lease_seconds=0.2)
+        job, _ = await crashed.submit("build_graph", {"system_name": "Chat"})
+        # Popped, then the worker dies before loading or running the job
+        popped = await crashed.backend.pop(timeout=0.01, lease_until=time.time() + 0.2)
+        leased = redis_client.zscore(RedisJobBackend.LEASES_KEY, popped)
+
+        survivor = make_redis_queue(handler, lease_seconds=0.2)
+        survivor.start()
+        done = await survivor.wait(job["id"], timeout=5)
+        await survivor.stop()
+        return popped == job["id"], leased, done, survivor.reclaimed
+
+    popped, leased, done, reclaimed = asyncio.run(scenario())
+    assert popped and leased is not None
+    assert done["status"] == "succeeded" and done["attempts"] == 1
+    assert reclaimed == 1
+
+
+def test_reclaimed_finished_job_drops_its_lease():
+    async def scenario():
+        backend = RedisJobBackend(redis_client)
+        queue = JobQueue(backend=backend, workers=1)
+        await backend.save({"id": "done-job", "status": "succeeded"})
+        await backend.push("done-job")
+        job_id = await backend.pop(timeout=0.01, lease_until=time.time() + 60)
+        await queue.run_job(job_id)
+
+    asyncio.run(scenario())
+    assert redis_client.zcard(RedisJobBackend.LEASES_KEY) == 0
+    assert redis_client.llen(RedisJobBackend.QUEUE_KEY) == 0
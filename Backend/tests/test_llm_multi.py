@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from app.core.cache import get_cached_responses, set_cached_response
+from app.llm import client
+from app.llm.client import build_prompt, call_llm, call_llm_multi
+
+
+def design(*names):
+    return {"components": [{"name": name} for name in names], "edges": []}
+
+
+def stub_llm(monkeypatch, batch_response: str, fail: set = frozenset()):
+    """Stub the batched completion and the single-node fallback; returns the call log"""
+    calls = {"batch": [], "single": []}
+
+    async def complete(system_name, prompt, use_negative_cache=True, speculative=False):
+        calls["batch"].append(prompt)
+        return batch_response
+
+    async def generate(system_name, prompt, use_negative_cache=True, speculative=False):
+        calls["single"].append(system_name)
+        if system_name in fail:
+            raise RuntimeError(f"{system_name} failed")
+        result = dict(design(f"{system_name} single"), system=system_name)
+        set_cached_response(prompt, result)
+        return result
+
+    monkeypatch.setattr(client, "_complete", complete)
+    monkeypatch.setattr(client, "_generate", generate)
+    return calls
+
+
+def test_batched_response_is_split_validated_and_cached_per_label(monkeypatch):
+    response = json.dumps({"subgraphs": {
+        "Gateway": design("Router", "Auth Filter"),
+        "Orders": {"components": [], "edges": []},  # Invalid: no components
+        "Extra": design("Unrequested")                # Not asked for
+        # "Payments" is missing
+    }})
+    calls = stub_llm(monkeypatch, response)
+
+    results = asyncio.run(call_llm_multi("Shop", ["Gateway", "Orders", "Payments"]))
+
+    assert list(results) == ["Gateway", "Orders", "Payments"]
+    assert results["Gateway"] == dict(design("Router", "Auth Filter"), system="Shop::Gateway")
+    assert sorted(calls["single"]) == ["Shop::Orders", "Shop::Payments"]
+    assert results["Orders"]["components"] == [{"name": "Shop::Orders single"}]
+    assert len(calls["batch"]) == 1
+
+    # Cached under the same key as a single expansion; the extra label isn't
+    assert get_cached_responses([build_prompt("Shop::Extra")]) == [None]
+    assert asyncio.run(call_llm("Shop::Gateway")) == results["Gateway"]
+    assert len(calls["single"]) == 2
+
+
+def test_cached_labels_are_left_out_of_the_batch(monkeypatch):
+    set_cached_response(build_prompt("Shop::Gateway"), dict(design("Cached"), system="Shop::Gateway"))
+    response = json.dumps({"subgraphs": {"Orders": design("Queue"), "Payments": design("Ledger")}})
+    calls = stub_llm(monkeypatch, response)
+
+    results = asyncio.run(call_llm_multi("Shop", ["Gateway", "Orders", "Payments", "Orders"]))
+
+    assert list(results) == ["Gateway", "Orders", "Payments"]
+    assert results["Gateway"]["components"] == [{"name": "Cached"}]
+    assert "Gateway" not in calls["batch"][0] and "Payments" in calls["batch"][0]
+    assert calls["single"] == []
+
+
+def test_unparseable_batch_falls_back_to_single_calls(monkeypatch):
+    calls = stub_llm(monkeypatch, "Sorry, I can't help with that.", fail={"Shop::Payments"})
+
+    results = asyncio.run(call_llm_multi("Shop", ["Orders", "Payments"]))
+
+    assert sorted(calls["single"]) == ["Shop::Orders", "Shop::Payments"]
+    assert results["Orders"]["system"] == "Shop::Orders"
+    assert isinstance(results["Payments"], RuntimeError)
+
+
+def test_single_missing_label_skips_the_batch_prompt(monkeypatch):
+    calls = stub_llm(monkeypatch, "{}")
+
+    asyncio.run(call_llm_multi("Shop", ["Orders"]))
+
+    assert calls == {"batch": [], "single": ["Shop::Orders"]}
@@ -0,0 +1,170 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app.llm.router import LLMBackend, LLMRouter, LatencyTracker, load_backends
+
+
+class RecordingMonitor:
+    def __init__(self):
+        self.calls = []
+
+    def record_call(self, system_name, model="unknown", usage=None, speculative=False, hedged=False):
+        self.calls.append({"model": model, "usage": usage, "hedged": hedged})
+
+
+@asynccontextmanager
+async def stub_server(delay: float = 0.0, status: int = 200, content: str = "{}"):
+    """Minimal OpenAI-compatible endpoint answering after `delay` seconds"""
+
+    async def handle(reader, writer):
+        headers = (await reader.readuntil(b"\r\n\r\n")).decode()
+        length = next(
+            int(line.split(":")[1])
+            for line in headers.split("\r\n")
+            if line.lower().startswith("content-length")
+        )
+        await reader.readexactly(length)
+        await asyncio.sleep(delay)
+        body = json.dumps({
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20}
+        }).encode()
+        writer.write(
+            f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1/chat/completions"
+    finally:
+        server.close()
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_fast_primary_is_not_hedged():
+    async def scenario():
+        async with stub_server(content="a") as a, stub_server(content="b") as b:
+            monitor = RecordingMonitor()
+            router = LLMRouter(
+                [LLMBackend("a", a, "model-a"), LLMBackend("b", b, "model-b")],
+                monitor=monitor,
+                hedge_default_delay=1.0
+            )
+            return await router.complete(MESSAGES, "Shop"), router, monitor
+
+    content, router, monitor = asyncio.run(scenario())
+    assert content == "a"
+    assert router.hedges_sent == 0
+    assert monitor.calls == [
+        {"model": "model-a", "usage": {"prompt_tokens": 100, "completion_tokens": 20}, "hedged": False}
+    ]
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    async def scenario():
+        async with stub_server(delay=0.5, content="slow") as a, stub_server(content="fast") as b:
+            monitor = RecordingMonitor()
+            router = LLMRouter(
+                [LLMBackend("a", a, "model-a"), LLMBackend("b", b, "model-b")],
+                monitor=monitor,
+                hedge_default_delay=0.05
+            )
+            return await router.complete(MESSAGES, "Shop"), router, monitor
+
+    content, router, monitor = asyncio.run(scenario())
+    assert content == "fast"
+    assert (router.hedges_sent, router.hedge_wins) == (1, 1)
+    assert monitor.calls[0]["model"] == "model-b" and not monitor.calls[0]["hedged"]
+    # Cancelled primary: its prompt is billed as hedging overhead
+    assert monitor.calls[1] == {"model": "model-a", "usage": {"prompt_tokens": 100}, "hedged": True}
+
+
+def test_failing_primary_fails_over_immediately():
+    async def scenario():
+        async with stub_server(status=500) as a, stub_server(content="ok") as b:
+            router = LLMRouter(
+                [LLMBackend("a", a, "model-a"), LLMBackend("b", b, "model-b")],
+                monitor=RecordingMonitor(),
+                hedge_default_delay=10
+            )
+            return await router.complete(MESSAGES, "Shop"), router
+
+    content, router = asyncio.run(scenario())
+    assert content == "ok"
+    assert (router.failovers, router.hedges_sent) == (1, 0)
+
+
+def test_fast_failed_backup_does_not_hide_the_primary_error():
+    async def scenario():
+        async with stub_server(status=500) as a:
+            backup = LLMBackend("b", "http://127.0.0.1:9/unused", "model-b")
+            backup.breaker.state, backup.breaker.probe_in_flight = "half_open", True
+            router = LLMRouter([LLMBackend("a", a, "model-a"), backup], monitor=RecordingMonitor())
+            try:
+                await router.complete(MESSAGES, "Shop")
+            except Exception as e:
+                return e
+
+    error = asyncio.run(scenario())
+    assert isinstance(error, httpx.HTTPStatusError)
+
+
+def test_latency_tracker_percentiles_and_ewma():
+    tracker = LatencyTracker(window=10, alpha=0.5)
+    for seconds in [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]:
+        tracker.record(seconds)
+
+    assert tracker.percentile(0.5) == 6
+    assert tracker.percentile(0.9) == 10
+    assert 9 < tracker.ewma < 10
+
+
+def test_cancelled_attempt_records_no_latency():
+    async def scenario():
+        async with stub_server(delay=0.5, content="slow") as a, stub_server(content="fast") as b:
+            primary, secondary = LLMBackend("a", a, "model-a"), LLMBackend("b", b, "model-b")
+            router = LLMRouter([primary, secondary], monitor=RecordingMonitor(), hedge_default_delay=0.05)
+            await router.complete(MESSAGES, "Shop")
+            return primary, secondary
+
+    primary, secondary = asyncio.run(scenario())
+    assert primary.latency.get_stats()["samples"] == 0
+    assert secondary.latency.get_stats()["samples"] == 1
+
+
+def test_primary_configured_backend_shares_the_default_breaker():
+    default = LLMBackend("groq", "http://groq", "model")
+    spec = json.dumps([
+        {"name": "a", "url": "http://a", "model": "model-a"},
+        {"name": "b", "url": "http://b", "model": "model-b"}
+    ])
+
+    primary, other = load_backends(spec, default=default)
+
+    assert primary.breaker is default.breaker
+    assert other.breaker is not default.breaker
+    assert load_backends("", default=default) == [default]
+
+
+def test_slot_lease_outlasts_a_failover():
+    from app.core.rate_limiter import llm_concurrency
+    from app.llm.client import llm_router
+
+    router = LLMRouter([
+        LLMBackend("a", "http://a", "model", timeout=30),
+        LLMBackend("b", "http://b", "model", timeout=60),
+        LLMBackend("c", "http://c", "model", timeout=45),
+    ])
+
+    assert router.max_request_seconds() == 105
+    assert LLMRouter([LLMBackend("a", "http://a", "model")]).max_request_seconds() == 60
+    assert llm_concurrency.lease_ms > llm_router.max_request_seconds() * 1000
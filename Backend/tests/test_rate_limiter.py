@@ -0,0 +1,139 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from slowapi.errors import RateLimitExceeded
+
+from app.core.cache import set_cached_response
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.config import CACHE_REFRESH_MIN_HITS, LLM_CALL_WEIGHT
+from app.core.rate_limiter import (
+    ConcurrencyLimiter,
+    LLMOverloadedError,
+    WeightedRateLimitExceeded,
+    cost_aware_limit,
+    limiter,
+    note_llm_call,
+    rate_limit_handler,
+    weighted_rate_limit_handler,
+)
+from app.llm import client as llm_client
+from app.llm.client import build_prompt, call_llm
+
+
+app = FastAPI()
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
+app.add_exception_handler(WeightedRateLimitExceeded, weighted_rate_limit_handler)
+
+
+@app.get("/cached", dependencies=[Depends(cost_aware_limit("test", 10))])
+async def cached():
+    return {}
+
+
+@app.get("/paid", dependencies=[Depends(cost_aware_limit("test", 10))])
+async def paid():
+    note_llm_call()
+    return {}
+
+
+@app.get("/stale", dependencies=[Depends(cost_aware_limit("stale", 2))])
+async def stale():
+    # Hot stale hits: served from cache, refreshed in the background
+    for _ in range(CACHE_REFRESH_MIN_HITS):
+        await call_llm("Chat")
+    await asyncio.gather(*llm_client._refresh_tasks.values())
+    return {}
+
+
+@app.get("/circuit-open", dependencies=[Depends(cost_aware_limit("circuit", 2))])
+async def circuit_open():
+    try:
+        await llm_client._complete("Chat", build_prompt("Chat"))
+    except CircuitOpenError:
+        pass
+    return {}
+
+
+@app.get("/fixed")
+@limiter.limit("2/minute")
+async def fixed(request: Request):
+    return {}
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def test_admission_costs_one_token(client):
+    statuses = [client.get("/cached").status_code for _ in range(11)]
+
+    assert statuses == [200] * 10 + [429]
+
+
+def test_llm_calls_are_charged_after_the_call(client):
+    assert 10 // LLM_CALL_WEIGHT == 2
+    assert client.get("/paid").status_code == 200
+    assert client.get("/paid").status_code == 200
+
+    response = client.get("/cached")
+    assert response.status_code == 429
+    retry_after = int(response.headers["Retry-After"])
+    assert response.json()["retry_after"] == retry_after
+    # Up to the rest of this window, plus the time the full window needs
+    # to decay once it becomes the previous one
+    assert 1 <= retry_after <= 2 * 60
+
+
+def test_background_refresh_is_not_charged_to_the_request(client, monkeypatch):
+    refreshed = []
+
+    async def complete(messages, system_name, speculative=False):
+        refreshed.append(system_name)
+        return json.dumps({"components": [{"name": "API"}], "edges": []})
+
+    monkeypatch.setattr(llm_client.llm_router, "complete", complete)
+    set_cached_response(build_prompt("Chat"), {"components": [{"name": "Old"}], "edges": []}, soft_ttl=0)
+
+    # Budget of 2: each request costs 1 token, as neither reached the LLM itself
+    assert [client.get("/stale").status_code for _ in range(3)] == [200, 200, 429]
+    assert refreshed == ["Chat"]
+
+
+def test_circuit_open_fast_fail_is_not_charged(client, monkeypatch):
+    async def complete(messages, system_name, speculative=False):
+        raise CircuitOpenError("llm", 30)
+
+    monkeypatch.setattr(llm_client.llm_router, "complete", complete)
+
+    assert [client.get("/circuit-open").status_code for _ in range(3)] == [200, 200, 429]
+
+
+def test_fixed_window_limit_sends_retry_after(client):
+    assert [client.get("/fixed").status_code for _ in range(2)] == [200, 200]
+
+    response = client.get("/fixed")
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 60
+    assert response.json()["retry_after"] == int(response.headers["Retry-After"])
+
+
+def test_expired_lease_frees_its_slot():
+    limiter_ = ConcurrencyLimiter(max_in_flight=1, lease_seconds=0.1)
+    crashed = limiter_.slot()
+    crashed.__enter__()  # Never released, like a worker that died mid-call
+
+    with pytest.raises(LLMOverloadedError):
+        with limiter_.slot():
+            pass
+    assert limiter_.shed == 1
+
+    time.sleep(0.15)
+    with limiter_.slot():
+        assert limiter_.in_flight() == 1
+    assert limiter_.in_flight() == 0
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services import snapshot_retention
+from app.services.snapshot_retention import SnapshotPruner
+
+SINCE = datetime(2026, 7, 1, 12, 0)
+
+
+def victims(rows, keep_versions=3, since=SINCE):
+    return sorted(row_id for row_id, _ in SnapshotPruner.select_victims(rows, keep_versions, since))
+
+
+def test_keeps_the_last_n_versions_before_the_checkpoint_window():
+    # One snapshot a day, all older than the checkpoint window
+    rows = [(f"v{v}", v, SINCE - timedelta(days=40 - v)) for v in range(1, 11)]
+
+    assert victims(rows) == sorted(f"v{v}" for v in range(1, 8))
+    assert victims(rows, keep_versions=0) == sorted(f"v{v}" for v in range(1, 11))
+
+
+def test_keeps_the_newest_snapshot_of_each_day_in_the_window():
+    day = SINCE + timedelta(days=3)
+    rows = [
+        ("d1-a", 1, day.replace(hour=8)),
+        ("d1-b", 2, day.replace(hour=17)),
+        ("d2-a", 3, day.replace(hour=9) + timedelta(days=1)),
+        ("d2-b", 4, day.replace(hour=10) + timedelta(days=1)),
+        ("d2-c", 5, day.replace(hour=11) + timedelta(days=1)),
+    ]
+
+    # d2-c is both a checkpoint and among the last 2; d2-b is the other of the last 2
+    assert victims(rows, keep_versions=2) == ["d1-a", "d2-a"]
+
+
+def test_checkpoint_boundary_day():
+    rows = [
+        ("before-day", 1, SINCE - timedelta(days=1)),
+        ("boundary-early", 2, SINCE - timedelta(hours=3)),
+        ("boundary-exact", 3, SINCE),
+        ("latest", 4, SINCE + timedelta(days=5)),
+    ]
+
+    # The boundary day's newest snapshot is at checkpoint_since, so it's kept
+    assert victims(rows, keep_versions=1) == ["before-day", "boundary-early"]
+
+    # A second later the same day's newest snapshot falls outside the window
+    assert victims(rows, keep_versions=1, since=SINCE + timedelta(seconds=1)) == [
+        "before-day", "boundary-early", "boundary-exact"
+    ]
+
+
+def test_victims_carry_created_at_for_partition_pruning():
+    rows = [("old", 1, SINCE - timedelta(days=10)), ("new", 2, SINCE - timedelta(days=9))]
+
+    assert SnapshotPruner.select_victims(rows, 1, SINCE) == [("old", SINCE - timedelta(days=10))]
+
+
+def test_only_one_worker_runs_each_maintenance_pass(monkeypatch):
+    runs = []
+    monkeypatch.setattr(snapshot_retention, "ensure_partitions", lambda: runs.append("partitions"))
+
+    async def scenario():
+        workers = [SnapshotPruner() for _ in range(3)]
+        for worker in workers:
+            monkeypatch.setattr(worker, "prune", lambda: runs.append("prune"))
+        loops = [asyncio.create_task(w.run_scheduled(interval=60, prune=False)) for w in workers]
+        await asyncio.sleep(0.2)
+        for loop in loops:
+            loop.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+    assert runs == ["partitions"]
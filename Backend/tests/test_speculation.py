@@ -0,0 +1,122 @@
+import asyncio
+
+from app.core.cache import redis_client
+from app.core.cost_monitor import cost_monitor
+from app.core.rate_limiter import note_llm_call, track_llm_calls
+from app.services import speculation_service
+from app.services.speculation_service import SpeculativeExpander, STATS_KEY
+
+SPEC_CALL = {"prompt_tokens": 8_000_000, "completion_tokens": 0}  # $0.60
+
+
+def node(node_id, level=1, expandable=True):
+    return {"id": node_id, "label": node_id.title(), "level": level, "expandable": expandable}
+
+
+def edge(source, target):
+    return {"source": source, "target": target}
+
+
+STATE = {
+    "system": "Chat",
+    "nodes": [node("api", 0), node("db"), node("cache"), node("queue"), node("cdn", expandable=False)],
+    "edges": [edge("api", "db"), edge("api", "cache"), edge("api", "queue"), edge("cdn", "api"),
+              edge("db", "queue"), edge("cdn", "db")]
+}
+
+
+def test_rank_candidates_by_degree_then_level_then_id():
+    ranked = SpeculativeExpander.rank_candidates(STATE, top_n=10)
+
+    # cdn (degree 2) isn't expandable
+    assert [n["id"] for n in ranked] == ["api", "db", "queue", "cache"]
+    assert [n["id"] for n in SpeculativeExpander.rank_candidates(STATE, top_n=2)] == ["api", "db"]
+
+    ties = {"nodes": [node("z", 2), node("y"), node("x")], "edges": []}
+    assert [n["id"] for n in SpeculativeExpander.rank_candidates(ties, top_n=3)] == ["x", "y", "z"]
+
+
+def test_speculative_budget_caps_only_speculative_spend():
+    cost_monitor.record_call("Chat", usage=SPEC_CALL)
+    assert cost_monitor.check_speculative_budget(max_cost=1.0)
+
+    cost_monitor.record_call("Chat", usage=SPEC_CALL, speculative=True)
+    assert cost_monitor.check_speculative_budget(max_cost=1.0)
+
+    cost_monitor.record_call("Chat", usage=SPEC_CALL, speculative=True)
+    assert not cost_monitor.check_speculative_budget(max_cost=1.0)
+
+
+def fake_llm(monkeypatch, calls: list):
+    async def call_llm_multi(system, labels, use_cache=True, speculative=False):
+        calls.append(list(labels))
+        return {label: {"components": [], "edges": []} for label in labels}
+
+    monkeypatch.setattr(speculation_service, "call_llm_multi", call_llm_multi)
+
+
+def test_speculation_over_budget_makes_no_llm_call(monkeypatch):
+    calls = []
+    fake_llm(monkeypatch, calls)
+    for _ in range(2):
+        cost_monitor.record_call("Chat", usage=SPEC_CALL, speculative=True)
+
+    async def scenario():
+        expander = SpeculativeExpander(top_n=3)
+        assert expander.schedule(STATE) == 3
+        await expander._tasks["Chat"]
+
+    asyncio.run(scenario())
+
+    assert calls == []
+    assert int(redis_client.hget(STATS_KEY, "skipped_budget")) == 3
+
+
+def test_cancel_on_another_worker_stops_pending_speculation(monkeypatch):
+    calls = []
+    fake_llm(monkeypatch, calls)
+
+    async def scenario():
+        worker_a, worker_b = SpeculativeExpander(top_n=3), SpeculativeExpander(top_n=3)
+        worker_a.schedule(STATE)
+        assert worker_b.cancel("Chat") is True
+        await worker_a._tasks["Chat"]
+        assert worker_b.cancel("Chat") is False
+
+    asyncio.run(scenario())
+
+    assert calls == []
+    assert int(redis_client.hget(STATS_KEY, "superseded")) == 3
+
+
+def test_rebuild_on_another_worker_supersedes_pending_speculation(monkeypatch):
+    calls = []
+    fake_llm(monkeypatch, calls)
+
+    async def scenario():
+        worker_a, worker_b = SpeculativeExpander(top_n=3), SpeculativeExpander(top_n=1)
+        worker_a.schedule(STATE)
+        worker_b.schedule(STATE)
+        await asyncio.gather(worker_a._tasks["Chat"], worker_b._tasks["Chat"])
+
+    asyncio.run(scenario())
+
+    assert calls == [["Api"]]
+
+
+def test_speculation_is_not_counted_against_the_triggering_request(monkeypatch):
+    async def call_llm_multi(system, labels, use_cache=True, speculative=False):
+        note_llm_call()
+        return {label: {"components": [], "edges": []} for label in labels}
+
+    monkeypatch.setattr(speculation_service, "call_llm_multi", call_llm_multi)
+
+    async def request():
+        usage = track_llm_calls()
+        expander = SpeculativeExpander(top_n=3)
+        expander.schedule(STATE)
+        await expander._tasks["Chat"]
+        return usage
+
+    assert asyncio.run(request()) == {"llm_calls": 0}
+    assert int(redis_client.hget(STATS_KEY, "speculated")) == 3